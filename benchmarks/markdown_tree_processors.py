@@ -0,0 +1,84 @@
+"""
+Measures the time spent in the Ursus Markdown tree processors (base_url, tasklist and responsive_images) when
+converting very long pages, like 20,000-word guides.
+
+Usage: python benchmarks/markdown_tree_processors.py [word count]
+
+Ursus must be installed (pip install -e .), because the Markdown extensions are loaded by name.
+"""
+from markdown import Markdown
+from ursus.config import config
+from ursus.context_processors.markdown import CombinedElementProcessor
+import sys
+import time
+
+
+def make_page(word_count: int) -> str:
+    """
+    Returns a long Markdown page with paragraphs, links, images and task lists
+    """
+    sections = []
+    words = 0
+    section_number = 0
+    while words < word_count:
+        section_number += 1
+        sections.append(
+            f"## Section {section_number}\n\n"
+            f"This paragraph explains [how to register](/guides/registration#step-{section_number}) and links to an "
+            f"[external page](https://example.com/{section_number}). It is *long enough* to look like a real guide, "
+            "with some **bold words**, `code` and an escaped\\_underscore.\n\n"
+            f"![Photo {section_number}](/images/photo\\_{section_number % 20}.jpg \"A caption\")\n\n"
+            f"- [x] Done item with a [link](/done/{section_number})\n"
+            "- [ ] Open item\n"
+            "- A normal item\n\n"
+            f"[![Thumbnail](/images/photo_{section_number % 20}.jpg)](/gallery/{section_number})\n"
+        )
+        words += 80
+    return "\n".join(sections)
+
+
+def make_context() -> dict:
+    transforms = [
+        {"max_size": (width, width), "output_mimetype": mimetype, "output_path": f"images/photo.{width}{suffix}"}
+        for width in (300, 800, 1600)
+        for mimetype, suffix in (("image/webp", ".webp"), ("image/jpeg", ".jpg"))
+    ]
+    return {"entries": {f"images/photo_{number}.jpg": {"transforms": transforms} for number in range(20)}}
+
+
+def benchmark(word_count: int, repeat: int = 5) -> None:
+    config.site_url = "https://example.com"
+    page = make_page(word_count)
+    markdown = Markdown(extensions=["base_url", "tasklist", "responsive_images", "attr_list", "footnotes"])
+    markdown.context = make_context()
+
+    # Time the tree processors separately from the rest of the conversion
+    tree_processor_time = 0.0
+    combined_processors = [
+        processor for processor in markdown.treeprocessors if isinstance(processor, CombinedElementProcessor)
+    ]
+    for processor in combined_processors:
+        run = processor.run
+
+        def timed_run(root, run=run):
+            nonlocal tree_processor_time
+            start = time.perf_counter()
+            run(root)
+            tree_processor_time += time.perf_counter() - start
+
+        processor.run = timed_run
+
+    conversion_time = 0.0
+    for _ in range(repeat):
+        markdown.reset()
+        start = time.perf_counter()
+        markdown.convert(page)
+        conversion_time += time.perf_counter() - start
+
+    print(f"{word_count} words, {len(combined_processors)} traversals of the document")
+    print(f"Tree processors: {tree_processor_time / repeat * 1000:.1f} ms per conversion")
+    print(f"Whole conversion: {conversion_time / repeat * 1000:.1f} ms per conversion")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -24,6 +24,7 @@ setup(
             "better_footnotes = ursus.context_processors.markdown:FootnotesExtension",
             "jinja = ursus.context_processors.markdown:JinjaExtension",
             "base_url = ursus.context_processors.markdown:BaseUrlExtension",
+            "highlight_cache = ursus.context_processors.markdown:HighlightCacheExtension",
             "responsive_images = ursus.context_processors.markdown:ResponsiveImagesExtension",
             "superscript = ursus.context_processors.markdown:SuperscriptExtension",
             "tasklist = ursus.context_processors.markdown:TaskListExtension",
@@ -1,25 +1,46 @@
-from ursus.utils import get_files_in_path, import_class, log_color, log_color_end
+from ursus.utils import get_shard_output_path, import_class, log_color, log_color_end
 from ursus.config import config
 from ursus.generators.static import StaticSiteGenerator
+from ursus.sources import get_content_source
 from watchdog.observers import Observer
 import logging
 import sys
 import time
 
 
-def build(watch_for_changes: bool = False) -> None:
+def build(
+    watch_for_changes: bool = False,
+    incremental: bool = False,
+    since: str | None = None,
+    shard: tuple[int, int] | None = None,
+) -> dict | None:
     """Runs ursus and builds a static website
 
     Args:
         watch_for_changes (bool, optional): Keep running, and rebuild when content or templates change
+        incremental (bool, optional): Only rebuild what changed since the last successful build
+        since (str, optional): Only rebuild what changed since this git commit, branch or tag
+        shard (tuple, optional): Only build one part of the website. (shard number, shard count), starting at 1.
+    Returns:
+        dict: If `since` is set, the output files that were created, modified and deleted
     """
+    if shard:
+        config.shard = shard
+        config.output_path = get_shard_output_path(config.output_path, *shard)
+
+    if watch_for_changes and config.image_encoder_profile is None:
+        config.image_encoder_profile = "draft"
+
     generator = StaticSiteGenerator()
 
     if watch_for_changes:
         observer = Observer()
 
         try:
-            generator.generate()
+            if incremental:
+                generator.generate_incremental()
+            else:
+                generator.generate()
         except:
             logging.exception("Could not generate site")
 
@@ -32,10 +53,19 @@ def build(watch_for_changes: bool = False) -> None:
         finally:
             observer.stop()
             observer.join()
+    elif since:
+        return generator.generate_since(since)
+    elif incremental:
+        generator.generate_incremental()
     else:
         generator.generate()
 
 
+def merge() -> None:
+    """Combines the shards of a sharded build in the output path"""
+    StaticSiteGenerator().merge_shards()
+
+
 def lint(files_to_lint=None, min_level=logging.INFO) -> None:
     """Lints the content for errors"""
     linters = [import_class(linter_path)() for linter_path in config.linters]
@@ -45,7 +75,7 @@ def lint(files_to_lint=None, min_level=logging.INFO) -> None:
     if files_to_lint:
         logging.info(f"Linting {', '.join(map(str, files_to_lint))}")
 
-    for file_path in sorted(get_files_in_path(config.content_path, whitelist=files_to_lint)):
+    for file_path in sorted(get_content_source().get_files(whitelist=files_to_lint)):
         for linter in linters:
             linter_errors = list(linter.lint(file_path))
             for position, message, level in linter_errors:
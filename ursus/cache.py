@@ -0,0 +1,118 @@
+from pathlib import Path
+from typing import Any
+from ursus.config import config
+import hashlib
+import logging
+import pickle
+import sqlite3
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class Cache:
+    """
+    A persistent key-value store, saved in config.cache_path. It remembers the result of slow operations between
+    builds. Values can be anything that can be pickled.
+
+    Each cache has a name, so that different parts of Ursus can use the same keys without conflicts. If
+    config.persistent_cache is False, the values are only kept in memory.
+    """
+
+    filename = "cache.sqlite3"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    def connect(self) -> sqlite3.Connection:
+        database = ":memory:"
+        if config.persistent_cache:
+            try:
+                config.cache_path.mkdir(parents=True, exist_ok=True)
+                database = str(config.cache_path / self.filename)
+            except OSError:
+                logger.warning("Could not create cache directory %s. Caching in memory instead.", config.cache_path)
+
+        # The cache is used by the file watcher thread, not just the thread that created it
+        connection = sqlite3.connect(database, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache (name TEXT, key TEXT, value BLOB, PRIMARY KEY (name, key))"
+        )
+        return connection
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # Connect lazily, because config.cache_path can change after the cache is created
+        if self._connection is None:
+            self._connection = self.connect()
+        return self._connection
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM cache WHERE name = ? AND key = ?", (self.name, key)
+            ).fetchone()
+        if row is None:
+            return default
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            logger.debug("Could not read %s from %s cache", key, self.name)
+            return default
+
+    def set(self, key: str, value: Any) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO cache (name, key, value) VALUES (?, ?, ?)",
+                (self.name, key, pickle.dumps(value)),
+            )
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self.connection.execute("DELETE FROM cache WHERE name = ? AND key = ?", (self.name, key))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.connection.execute("DELETE FROM cache WHERE name = ?", (self.name,))
+
+
+def get_file_fingerprint(path: Path) -> tuple[int, int]:
+    """
+    Returns a cheap fingerprint of a file. If the fingerprint changes, the file probably changed.
+
+    Args:
+        path (Path): The absolute path of the file
+    Returns:
+        tuple: The file size and modification time (in nanoseconds)
+    """
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+file_hash_cache = Cache("file_hashes")
+
+
+def get_file_hash(path: Path) -> str:
+    """
+    Returns the SHA-256 hash of a file's content. The hash is cached until the file's size or modification time
+    change.
+
+    Args:
+        path (Path): The absolute path of the file
+    Returns:
+        str: The hexadecimal SHA-256 hash of the file
+    """
+    fingerprint = get_file_fingerprint(path)
+    cached_hash = file_hash_cache.get(str(path))
+    if cached_hash and cached_hash[0] == fingerprint:
+        return cached_hash[1]
+
+    with path.open("rb") as file:
+        file_hash = hashlib.file_digest(file, "sha256").hexdigest()
+    file_hash_cache.set(str(path), (fingerprint, file_hash))
+    return file_hash
@@ -25,6 +25,31 @@ def default_image_transforms(max_size: int = 5000) -> dict:
     }
 
 
+def default_image_encoder_profiles() -> dict:
+    return {
+        # High quality, small files. Slow.
+        "production": {
+            "resample": "lanczos",
+            "save_args": {
+                "*": {"optimize": True},
+                ".jpg": {"optimize": True, "progressive": True},
+                ".webp": {"optimize": True, "exact": True},
+            },
+        },
+        # Fast, but the quality is lower and the files are bigger. Used in watch mode.
+        "draft": {
+            "resample": "bilinear",
+            "reducing_gap": 1.5,
+            "save_args": {
+                "*": {},
+                ".avif": {"speed": 10},
+                ".png": {"compress_level": 1},
+                ".webp": {"exact": True, "method": 0},
+            },
+        },
+    }
+
+
 def default_jinja_filters() -> dict[str, Any]:
     return {}
 
@@ -35,6 +60,7 @@ def default_jinja_extensions() -> list[Any]:
         "ursus.renderers.jinja.JsLoaderExtension",
         "ursus.renderers.jinja.CssLoaderExtension",
         "ursus.renderers.jinja.ScssLoaderExtension",
+        "ursus.renderers.jinja.FragmentCacheExtension",
         "ursus.renderers.jinja.ResponsiveImageExtension",
     ]
 
@@ -56,6 +82,8 @@ def default_markdown_extensions() -> dict:
             "guess_lang": False,
         },
         "fenced_code": {},
+        # Must be after codehilite and fenced_code
+        "highlight_cache": {},
         "jinja": {},
         "responsive_images": {},
         "smarty": {},
@@ -91,9 +119,12 @@ def default_renderers() -> list[str]:
         "ursus.renderers.static.StaticAssetRenderer",
         "ursus.renderers.static.ArchiveRenderer",
         "ursus.renderers.image.ImageTransformRenderer",
+        # Must be before JinjaRenderer, so that templates can use asset_url() with compiled stylesheets
+        "ursus.renderers.sass.SassRenderer",
         "ursus.renderers.jinja.JinjaRenderer",
         "ursus.renderers.lunr.LunrIndexRenderer",
-        "ursus.renderers.sass.SassRenderer",
+        # Must be the last renderer, because it lists the output of the other renderers
+        "ursus.renderers.service_worker.ServiceWorkerRenderer",
     ]
 
 
@@ -109,9 +140,22 @@ class UrsusConfig:
     def __init__(self) -> None:
         self.content_path: Path = Path("content").resolve()
         self.templates_path: Path = Path("templates").resolve()
+
+        # Where the content is read. If None, it's read from content_path. For example,
+        # ursus.sources.memory.MemorySource({"posts/hello.md": "Hello world!"}) keeps the content in memory.
+        self.content_source: Any = None
         self.output_path: Path = Path("output").resolve()
+
+        # Where the rendered files are written. If None, they are written to output_path. For example,
+        # ursus.sinks.memory.MemorySink() keeps them in memory, and ursus.sinks.archive.ArchiveSink(Path("site.tar.gz"))
+        # writes them to an archive.
+        self.output_sink: Any = None
         self.cache_path: Path = Path(user_cache_dir("ursus", "nicolasb"))
 
+        # Remember the result of slow operations (image sizes, etc.) between builds, in cache_path.
+        # If False, the results are only remembered until Ursus exits.
+        self.persistent_cache: bool = True
+
         # The URL of this website's root, without a trailing slash. For example, https://allaboutberlin.com
         self.site_url: str = ""
 
@@ -122,17 +166,62 @@ class UrsusConfig:
         self.minify_js: bool = False
         self.minify_css: bool = False
 
+        # If set, {% allJs %} and {% allCss %} save the code to a file in this directory, and output a <script> or
+        # <link> tag instead of the code. The file name is based on its content, so browsers can cache it.
+        # Relative to output_path. For example, Path("bundles")
+        self.fragment_bundle_path: Path | None = None
+
         # Builds the static website faster by only rebuilding templates for files that changed.
         # Related pages might not be rebuilt, even if they might be affected by the changes.
         # If False, everything is rebuilt from scratch. It's recommended to disable fast_rebuilds in production.
         self.fast_rebuilds: bool = False
 
+        # Static assets, archives and unchanged images are cloned or copied to output_path. If True, they are hard
+        # linked when possible, which is faster and saves space. Hard linked output files share their content with the
+        # files in templates_path and content_path, so they must not be modified in place.
+        self.hard_link_static_files: bool = False
+
+        # Also save static assets and compiled stylesheets under a name that contains a hash of their content, for
+        # example style.3f9a1c2e.css. Use {{ asset_url('style.css') }} in templates to get the URL of the fingerprinted
+        # file. Fingerprinted files never change, so they can be cached by browsers forever.
+        self.fingerprint_assets: bool = False
+
+        # Only renders part of the website, so that a build can be split between multiple machines. It's a
+        # (shard number, shard count) tuple, starting at 1. For example, (2, 4) renders the second quarter of the website.
+        # Each shard is rendered to its own directory next to output_path. `ursus merge` combines them in output_path.
+        self.shard: tuple[int, int] | None = None
+
         # Sets the <img sizes=""> attribute for your content images
         self.image_default_sizes: str | None = None
 
         # Transforms applied to your content images
         self.image_transforms: dict = default_image_transforms()
 
+        # The settings used to resize and save images. The key is a profile name, and the value is a dict with:
+        # - "resample": The Pillow resampling filter (for example "lanczos" or "bilinear")
+        # - "reducing_gap": Overrides image_reducing_gap (optional)
+        # - "save_args": The arguments passed to Pillow's Image.save(), by output suffix. "*" is the default.
+        self.image_encoder_profiles: dict = default_image_encoder_profiles()
+
+        # The image encoder profile to use. If None, the "draft" profile is used in watch mode, and the "production"
+        # profile is used otherwise.
+        self.image_encoder_profile: str | None = None
+
+        # Only render new images when they are requested by the server, or in the background. This makes the first
+        # build much faster. If None, it's enabled when watching for changes and serving the website (ursus -ws).
+        # Ignored if the output sink does not support partial builds (for example ArchiveSink).
+        self.lazy_image_transforms: bool | None = None
+
+        # The maximum size of the rendered images kept in cache_path, in bytes. When it's exceeded after a full build,
+        # the oldest unused images are deleted. If None, the cache grows without limit.
+        self.image_transform_cache_size: int | None = 2 * 1024**3
+
+        # Images are shrunk in two steps: a fast reduction by an integer factor, then a slower, accurate resampling.
+        # The second step shrinks the image at least this many times. Bigger values are slower, but more accurate.
+        # At 3.0, the result is indistinguishable from a full resampling in most cases.
+        # If None, images are always fully resampled.
+        self.image_reducing_gap: float | None = 2.0
+
         """
         Parametres to generate a search index for lunr.js
         Example:
@@ -150,6 +239,13 @@ class UrsusConfig:
         self.lunr_indexes: dict = {}
         self.lunr_index_output_path: Path = Path("search-index.json")  # Relative to output_path
 
+        # The output files that a service worker downloads in advance, so that they are available offline. Glob
+        # patterns that match the whole path, relative to output_path. "*" does not match "/". For example
+        # ["css/*.css", "js/*.js", "index.html"]. If empty, there is no service worker. Register the service worker in your templates: navigator.serviceWorker.register("/service-worker.js")
+        self.precache_patterns: list[str] = []
+        self.precache_manifest_output_path: Path = Path("precache-manifest.json")  # Relative to output_path
+        self.service_worker_output_path: Path = Path("service-worker.js")  # Relative to output_path
+
         # The processors that update the context with extra data
         self.context_processors: list[str] = default_context_processors()
         self.context_globals: dict = {}
@@ -167,6 +263,10 @@ class UrsusConfig:
 
         self.jinja_extensions: list[str] = default_jinja_extensions()
 
+        # Keep compiled Jinja templates in cache_path, so that they are not compiled again on the next build.
+        # Only used if persistent_cache is True.
+        self.jinja_bytecode_cache: bool = True
+
     logging = {
         "datefmt": "%Y-%m-%d %H:%M:%S",
         "format": "%(asctime)s %(levelname)s [%(name)s:%(lineno)d] %(message)s",
@@ -1,29 +1,67 @@
 from pathlib import Path
+from typing import Any
+from ursus.cache import Cache
 from ursus.config import config
 from ursus.context_processors import Context, EntryContextProcessor, EntryURI
+from ursus.sources import get_content_source
 from ursus.utils import (
     is_raster_image,
-    get_image_size,
+    get_image_metadata,
     get_image_transforms,
     is_image,
     is_pdf,
 )
 
 
+# Increment this when the cached metadata changes, so that metadata cached by older versions of Ursus is not used
+metadata_version = 2
+
+
 class ImageProcessor(EntryContextProcessor):
+    """
+    Adds the dimensions and transforms of images and PDFs to their entry.
+
+    Reading images and matching transforms is slow on large sites, so the results are cached. They are only computed
+    again if the file or config.image_transforms change.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.metadata_cache = Cache("image_metadata")
+
+    def get_metadata(self, abs_path: Path, entry_uri: EntryURI) -> dict[str, Any]:
+        fingerprint = (
+            metadata_version,
+            get_content_source().get_fingerprint(abs_path),
+            repr(config.image_transforms),
+        )
+        cached_metadata = self.metadata_cache.get(str(abs_path))
+        if cached_metadata and cached_metadata.get("fingerprint") == fingerprint:
+            return cached_metadata
+
+        metadata: dict[str, Any] = {"fingerprint": fingerprint}
+        image_size = None
+        if is_raster_image(abs_path):
+            metadata.update(get_image_metadata(abs_path))
+            image_size = (metadata["width"], metadata["height"])
+        metadata["transforms"] = list(get_image_transforms(Path(entry_uri), image_size))
+
+        self.metadata_cache.set(str(abs_path), metadata)
+        return metadata
+
     def process_entry(self, context: Context, entry_uri: EntryURI) -> None:
         abs_path = config.content_path / entry_uri
-        if is_raster_image(abs_path):
-            width, height = get_image_size(abs_path)
-            context["entries"][entry_uri].update(
-                {
-                    "width": width,
-                    "height": height,
-                }
-            )
         if is_image(abs_path) or is_pdf(abs_path):
+            metadata = self.get_metadata(abs_path, entry_uri)
+            if "width" in metadata:
+                context["entries"][entry_uri].update(
+                    {
+                        "width": metadata["width"],
+                        "height": metadata["height"],
+                    }
+                )
             context["entries"][entry_uri].update(
                 {
-                    "transforms": list(get_image_transforms(Path(entry_uri))),
+                    "transforms": metadata["transforms"],
                 }
             )
@@ -2,6 +2,8 @@ from . import Context, EntryContextProcessor, EntryURI
 from datetime import date as date_type, datetime, time as time_type
 from markdown import Markdown
 from markdown.extensions import Extension
+from markdown.extensions.codehilite import HiliteTreeprocessor
+from markdown.extensions.fenced_code import FencedBlockPreprocessor
 from markdown.extensions.footnotes import (
     FootnoteExtension,
     FN_BACKLINK_TEXT,
@@ -13,66 +15,157 @@ from markdown.preprocessors import Preprocessor
 from markdown.treeprocessors import Treeprocessor
 from pathlib import Path
 from typing import Any
+from ursus.cache import Cache
 from ursus.config import config
+from ursus.sources import get_content_source
 from ursus.utils import make_figure_element, make_picture_element
 import yaml
 from xml.etree import ElementTree
 from xml.etree.ElementTree import Element
+import copy
+import hashlib
+import json
 import logging
+import markdown
+import pygments
 import re
 
 
 logger = logging.getLogger(__name__)
 
+# The highlighted HTML of code blocks
+highlight_cache = Cache("code_highlighting")
 
-class BaseUrlProcessor(Treeprocessor):
+
+class ElementProcessor(Treeprocessor):
+    """
+    Base class for tree processors that transform elements with specific tags. The element processors of a document
+    are combined in a CombinedElementProcessor, so that the document is only traversed once.
+
+    Subclasses define `tags`, and override process_element().
+    """
+
+    tags: tuple[str, ...] = ()
+
+    def process_element(self, element: Element, ancestors: list[Element], indexes: list[int]) -> None:
+        """
+        Args:
+            element (Element): An element with one of the processed tags
+            ancestors (list): The ancestors of the element, from the root to its parent
+            indexes (list): The position of each ancestor's child on the path to the element. The element is
+                ancestors[-1][indexes[-1]].
+        """
+        raise NotImplementedError
+
+    def run(self, root: Element) -> None:
+        walk_element_tree(root, {tag: [self] for tag in self.tags})
+
+
+def walk_element_tree(
+    element: Element,
+    processors: dict[str, list[ElementProcessor]],
+    ancestors: list[Element] | None = None,
+    indexes: list[int] | None = None,
+) -> None:
+    """
+    Calls the element processors of each descendant of the element, in document order. If a processor replaces an
+    element, the new element's children are not processed.
+    """
+    ancestors = ancestors or []
+    indexes = indexes or []
+    ancestors.append(element)
+    indexes.append(0)
+    for index, child in enumerate(element):
+        indexes[-1] = index
+        for processor in processors.get(child.tag, ()):
+            processor.process_element(child, ancestors, indexes)
+            if element[index] is not child:
+                break
+        if len(child) and element[index] is child:
+            walk_element_tree(child, processors, ancestors, indexes)
+    ancestors.pop()
+    indexes.pop()
+
+
+class CombinedElementProcessor(Treeprocessor):
+    """
+    Runs multiple element processors in a single traversal of the document.
+    """
+
+    def __init__(self, md=None):
+        super().__init__(md)
+        self.processors: dict[str, list[ElementProcessor]] = {}
+
+    def add_processor(self, processor: ElementProcessor) -> None:
+        for tag in processor.tags:
+            self.processors.setdefault(tag, []).append(processor)
+
+    def run(self, root: Element) -> None:
+        walk_element_tree(root, self.processors)
+
+    @classmethod
+    def register(cls, md, processor: ElementProcessor, priority: int = -10) -> None:
+        """
+        Adds an element processor to the document's CombinedElementProcessor with this priority. Processors with the
+        same priority share one traversal of the document.
+
+        By default, it runs after the other tree processors, including "unescape" (priority 0), so that links and
+        images contain their final URL. At priority 100, it runs before inline patterns, on the raw Markdown text.
+        """
+        name = "ursus_elements" if priority == -10 else f"ursus_elements_{priority}"
+        if name not in md.treeprocessors:
+            md.treeprocessors.register(cls(md), name, priority)
+        md.treeprocessors[name].add_processor(processor)
+
+
+class BaseUrlProcessor(ElementProcessor):
     """
     Adds the base URL from config.site_url to absolute links.
 
     /blog/test-post becomes https://example.com/blog/test-post
     """
 
-    def run(self, root):
-        for el in root.iter("a"):
-            href = el.get("href", "")
-            if href.startswith("/"):
-                el.set("href", config.site_url + href)
+    tags = ("a",)
+
+    def process_element(self, element: Element, ancestors: list[Element], indexes: list[int]) -> None:
+        href = element.get("href", "")
+        if href.startswith("/"):
+            element.set("href", config.site_url + href)
 
 
 class BaseUrlExtension(Extension):
     def extendMarkdown(self, md):
-        md.treeprocessors.register(BaseUrlProcessor(md), "baseurl", 15)
+        CombinedElementProcessor.register(md, BaseUrlProcessor(md))
 
 
-class TaskListProcessor(Treeprocessor):
+class TaskListProcessor(ElementProcessor):
     box_checked = "[x] "
     box_unchecked = "[ ] "
+    tags = ("li",)
 
     def __init__(self, extension: "TaskListExtension"):
+        super().__init__()
         self.extension = extension
 
-    def run(self, root: Element) -> Element:
-        for li in root.iter(tag="li"):
-            text = li.text or ""
+    def process_element(self, li: Element, ancestors: list[Element], indexes: list[int]) -> None:
+        text = li.text or ""
 
-            if text.lower().startswith((self.box_checked, self.box_unchecked)):
-                is_checked = text.lower().startswith(self.box_checked)
+        if text.lower().startswith((self.box_checked, self.box_unchecked)):
+            is_checked = text.lower().startswith(self.box_checked)
 
-                checkbox = Element("input", {"type": "checkbox"})
-                if is_checked:
-                    checkbox.attrib["checked"] = "checked"
-                if self.extension.getConfig("checkbox_class"):
-                    checkbox.attrib["class"] = self.extension.getConfig("checkbox_class")
+            checkbox = Element("input", {"type": "checkbox"})
+            if is_checked:
+                checkbox.attrib["checked"] = "checked"
+            if self.extension.getConfig("checkbox_class"):
+                checkbox.attrib["class"] = self.extension.getConfig("checkbox_class")
 
-                checkbox.tail = text.removeprefix(self.box_checked if is_checked else self.box_unchecked)
-                li.text = ""
-                li.insert(0, checkbox)
-                if self.extension.getConfig("list_item_class"):
-                    css_classes = set(li.attrib.get("class", "").split())
-                    css_classes.update(self.extension.getConfig("list_item_class").split())
-                    li.attrib["class"] = " ".join(css_classes)
-
-        return root
+            checkbox.tail = text.removeprefix(self.box_checked if is_checked else self.box_unchecked)
+            li.text = ""
+            li.insert(0, checkbox)
+            if self.extension.getConfig("list_item_class"):
+                css_classes = set(li.attrib.get("class", "").split())
+                css_classes.update(self.extension.getConfig("list_item_class").split())
+                li.attrib["class"] = " ".join(css_classes)
 
 
 class TaskListExtension(Extension):
@@ -91,7 +184,8 @@ class TaskListExtension(Extension):
         super().__init__(**kwargs)
 
     def extendMarkdown(self, md):
-        md.treeprocessors.register(TaskListProcessor(self), "gfm-tasklist", 100)
+        # Before inline patterns, so that "[x] [link]" is not turned into a link first
+        CombinedElementProcessor.register(md, TaskListProcessor(self), priority=100)
 
 
 class JinjaPreprocessor(Preprocessor):
@@ -136,7 +230,9 @@ class JinjaExtension(Extension):
         md.postprocessors.register(JinjaHtmlPostProcessor(md), "raw_html", 30)
 
 
-class ResponsiveImageProcessor(Treeprocessor):
+class ResponsiveImageProcessor(ElementProcessor):
+    tags = ("img",)
+
     allowed_parents = (
         "a",
         "p",
@@ -161,25 +257,15 @@ class ResponsiveImageProcessor(Treeprocessor):
         "details",
     )
 
-    def _swap_element(self, parent: Element, old: Element, new: Element) -> None:
-        """
-        Replaces `old` element with `new` in `parent` element
-        """
-        for index, element in enumerate(parent):
-            if element == old:
-                parent[index] = new
-                new.tail = old.tail
-                return
-
-    def _upgrade_img(self, img: Element, parents: list[Element]) -> None:
+    def process_element(self, img: Element, ancestors: list[Element], indexes: list[int]) -> None:
         # Create <picture> with <source> for the different image types and sizes
         # Only apply to local images
         img_src = img.attrib.get("src", "")
         if img_src.startswith("/") or img_src.startswith(config.site_url + "/"):
             image_uri = EntryURI(img_src.removeprefix(config.site_url).removeprefix("/"))
 
-            parent = parents[0]
-            grandparent = parents[1]
+            parent = ancestors[-1]
+            grandparent = ancestors[-2]
 
             def has_single_child(element: Element) -> bool:
                 return len(element) == 1 and not element.text
@@ -188,31 +274,26 @@ class ResponsiveImageProcessor(Treeprocessor):
             a_attrs = None
             image_maker = make_figure_element
 
-            element_to_swap = img
-            containing_element = parent
+            # The element replaced by the image is the nth ancestor of the img (0 is the img itself)
+            swapped_generation = 0
 
             # A valid <figure> parent with an empty <a> wrapping this <img>
             # In this case, wrap the <figure> around the <a>
             # li > a > img becomes li > figure > a > picture
             if parent.tag == "a" and has_single_child(parent) and grandparent.tag in self.allowed_parents:
                 a_attrs = parent.attrib
-                element_to_swap = parent
-                containing_element = grandparent
+                swapped_generation = 1
 
                 # An empty <p> with an empty <a> with this <img>
                 # Replace the whole thing with a <figure> containing the <a>
                 # p > a > img becomes p > figure > a > picture
                 if grandparent.tag == "p" and has_single_child(grandparent):
-                    element_to_swap = grandparent
-
-                    greatgrandparent = parents[2]
-                    containing_element = greatgrandparent
+                    swapped_generation = 2
 
             # An empty <p> with this <img>
             # p > img becomes figure > picture
             elif parent.tag == "p" and has_single_child(parent):
-                element_to_swap = parent
-                containing_element = grandparent
+                swapped_generation = 1
 
             # This element does not allow a <figure>. Just use a <picture>.
             elif parent.tag not in self.allowed_parents:
@@ -226,22 +307,11 @@ class ResponsiveImageProcessor(Treeprocessor):
                 sizes=config.image_default_sizes,
             )
 
-            self._swap_element(containing_element, element_to_swap, image)
-
-    def run(self, root: Element) -> None:
-        parent_map = {}
-        for parent in root.iter():
-            for child in parent:
-                parent_map[child] = parent
-
-        for img in root.iter("img"):
-            child = img
-            parents = []
-            while parent := parent_map.get(child):
-                parents.append(parent)
-                child = parent
-
-            self._upgrade_img(img, parents)
+            # Replace the element with the image, in the element's parent
+            containing_element = ancestors[-1 - swapped_generation]
+            index = indexes[-1 - swapped_generation]
+            image.tail = containing_element[index].tail
+            containing_element[index] = image
 
 
 class ResponsiveImagesExtension(Extension):
@@ -257,12 +327,93 @@ class ResponsiveImagesExtension(Extension):
         md.registerExtension(self)
         self.md = md
         self.reset()
-        md.treeprocessors.register(ResponsiveImageProcessor(md), "figure", 0)
+        CombinedElementProcessor.register(md, ResponsiveImageProcessor(md))
 
     def reset(self) -> None:
         pass
 
 
+def get_highlight_cache_key(code: str, *options: Any) -> str:
+    """
+    Returns:
+        str: A key that identifies the highlighted HTML of a code block, with the given highlighting options
+    """
+    return hashlib.sha256(
+        json.dumps(
+            [markdown.__version__, pygments.__version__, code, options],
+            sort_keys=True,
+            default=lambda value: f"{getattr(value, '__module__', '')}.{getattr(value, '__qualname__', repr(value))}",
+        ).encode()
+    ).hexdigest()
+
+
+class CachedFencedBlockPreprocessor(FencedBlockPreprocessor):
+    """
+    Highlights fenced code blocks like FencedBlockPreprocessor, but remembers the highlighted HTML of each block.
+    """
+
+    def run(self, lines: list[str]) -> list[str]:
+        if not self.checked_for_deps:
+            super().run([])  # Reads the codehilite config
+
+        text = "\n".join(lines)
+        chunks = []
+        position = 0
+        for match in self.FENCED_BLOCK_RE.finditer(text):
+            cache_key = get_highlight_cache_key(match[0], self.config, self.codehilite_conf, self.use_attr_list)
+            html = highlight_cache.get(cache_key)
+            if html is None:
+                placeholder = "\n".join(super().run(match[0].split("\n"))).strip("\n")
+                highlight_cache.set(cache_key, self.md.htmlStash.rawHtmlBlocks[-1])
+            else:
+                placeholder = self.md.htmlStash.store(html)
+            chunks.extend([text[position : match.start()], f"\n{placeholder}\n"])
+            position = match.end()
+        chunks.append(text[position:])
+        return "".join(chunks).split("\n")
+
+
+class CachedHiliteTreeprocessor(HiliteTreeprocessor):
+    """
+    Highlights code blocks like HiliteTreeprocessor, but remembers the highlighted HTML of each block.
+    """
+
+    def run(self, root: Element) -> None:
+        for block in list(root.iter("pre")):
+            if len(block) == 1 and block[0].tag == "code" and block[0].text is not None:
+                cache_key = get_highlight_cache_key(block[0].text, self.config, self.md.tab_length)
+                html = highlight_cache.get(cache_key)
+                if html is None:
+                    container = Element("div")
+                    container.append(copy.deepcopy(block))
+                    super().run(container)
+                    placeholder = container[0].text
+                    highlight_cache.set(cache_key, self.md.htmlStash.rawHtmlBlocks[-1])
+                else:
+                    placeholder = self.md.htmlStash.store(html)
+                block.clear()
+                block.tag = "p"
+                block.text = placeholder
+
+
+class HighlightCacheExtension(Extension):
+    """
+    Remembers the highlighted HTML of code blocks in config.cache_path, so that Pygments does not highlight the same
+    code again. Must be loaded after the codehilite and fenced_code extensions.
+    """
+
+    def extendMarkdown(self, md):
+        if "fenced_code_block" in md.preprocessors:
+            fenced_code = md.preprocessors["fenced_code_block"]
+            md.preprocessors.register(
+                CachedFencedBlockPreprocessor(md, fenced_code.config), "fenced_code_block", 25
+            )
+        if "hilite" in md.treeprocessors:
+            hilite = CachedHiliteTreeprocessor(md)
+            hilite.config = md.treeprocessors["hilite"].config
+            md.treeprocessors.register(hilite, "hilite", 30)
+
+
 class SuperscriptExtension(Extension):
     """
     ^text^ is converted to <sup>text</sup>
@@ -358,7 +509,7 @@ class MarkdownProcessor(EntryContextProcessor):
 
     def process_entry(self, context: Context, entry_uri: EntryURI) -> None:
         if entry_uri.lower().endswith(".md"):
-            markdown_text = (config.content_path / entry_uri).read_text()
+            markdown_text = get_content_source().read_text(config.content_path / entry_uri)
             frontmatter, body = self._extract_frontmatter(markdown_text)
 
             self.markdown.context = context
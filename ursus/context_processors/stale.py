@@ -1,6 +1,7 @@
 from pathlib import Path
 from ursus.config import config
 from ursus.context_processors import Context, ContextProcessor
+from ursus.sources import get_content_source
 
 
 class StaleEntriesProcessor(ContextProcessor):
@@ -12,7 +13,7 @@ class StaleEntriesProcessor(ContextProcessor):
         self, context: Context, changed_files: set[Path] | None = None
     ) -> Context:
         for file in changed_files or set():
-            if file.is_relative_to(config.content_path) and not file.exists():
+            if file.is_relative_to(config.content_path) and not get_content_source().is_file(file):
                 entry_uri = str(file.relative_to(config.content_path))
                 try:
                     context["entries"].pop(entry_uri)
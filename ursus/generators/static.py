@@ -1,8 +1,17 @@
+from importlib import metadata
 from pathlib import Path
+from typing import Any
+from ursus.cache import Cache, get_file_hash
 from ursus.config import config
-from ursus.utils import import_class, get_files_in_path
+from ursus.sinks import get_output_sink
+from ursus.sources import get_content_source
+from ursus.utils import import_class, get_shard_output_path
 from watchdog.events import FileSystemEventHandler
+import git
+import hashlib
+import json
 import logging
+import re
 import threading
 
 
@@ -47,6 +56,61 @@ class GeneratorObserverEventHandler(FileSystemEventHandler):
         self.is_rebuilding = False
 
 
+memory_address_re = re.compile(r" at 0x[0-9a-fA-F]+")
+
+
+def get_stable_repr(value: Any) -> str:
+    """
+    Returns a representation of a value that does not change between runs. repr() includes the memory address of
+    functions and of most objects.
+    """
+    if isinstance(value, dict):
+        return "{" + ", ".join(sorted(f"{get_stable_repr(k)}: {get_stable_repr(v)}" for k, v in value.items())) + "}"
+    elif isinstance(value, (set, frozenset)):
+        return "{" + ", ".join(sorted(get_stable_repr(v) for v in value)) + "}"
+    elif isinstance(value, (list, tuple)):
+        return "[" + ", ".join(get_stable_repr(v) for v in value) + "]"
+    elif callable(value) and hasattr(value, "__qualname__"):
+        return f"{getattr(value, '__module__', '')}.{value.__qualname__}"
+    return memory_address_re.sub("", repr(value))
+
+
+def get_git_changed_files(git_ref: str) -> set[Path]:
+    """
+    Args:
+        git_ref (str): A git commit, branch or tag
+    Returns:
+        set: The absolute paths of the content and template files that were created, changed or deleted since that
+            commit, including uncommitted and untracked files. Renamed files are returned under both names.
+    """
+    changed_files = set()
+    for source_path in (config.content_path, config.templates_path):
+        # Git returns paths relative to the real repository root. They are converted back to paths in source_path,
+        # in case source_path is or contains a symlink.
+        real_source_path = source_path.resolve()
+        repo = git.Repo(real_source_path, search_parent_directories=True)
+        repo_root = Path(repo.working_dir).resolve()
+        git_paths = []
+
+        # -z separates the fields with NUL characters, and does not quote unusual file names
+        diff_fields = repo.git.diff("--name-status", "-M", "-z", git_ref, "--", str(real_source_path)).split("\0")
+        while len(diff_fields) > 1:
+            status = diff_fields.pop(0)
+            path_count = 2 if status.startswith(("R", "C")) else 1
+            for _ in range(path_count):
+                git_paths.append(diff_fields.pop(0))
+
+        untracked_files = repo.git.ls_files("--others", "--exclude-standard", "-z", "--", str(real_source_path))
+        git_paths.extend(path for path in untracked_files.split("\0") if path)
+
+        for git_path in git_paths:
+            real_path = repo_root / git_path
+            if real_path.is_relative_to(real_source_path):
+                changed_files.add(source_path / real_path.relative_to(real_source_path))
+
+    return changed_files
+
+
 class StaticSiteGenerator:
     """
     Turns a group of files and templates into a static website
@@ -62,6 +126,10 @@ class StaticSiteGenerator:
             "config": config,
             "entries": {},
         }
+        self.has_generated = False
+
+        # The source files of the last successful build, for incremental builds
+        self.build_cache = Cache("builds")
 
     def get_watched_paths(self) -> list[Path]:
         return [config.content_path, config.templates_path]
@@ -72,38 +140,240 @@ class StaticSiteGenerator:
     def on_file_changes(self, changed_files: set) -> None:
         self.generate(changed_files=changed_files)
 
-    def generate(self, changed_files=None):
+    def generate(self, changed_files: set[Path] | None = None) -> set[Path]:
+        """
+        Builds the website.
+
+        Args:
+            changed_files (set, optional): The content and template files that changed since the last build. If
+                None, everything is rebuilt.
+        Returns:
+            set: The output files of the website, relative to config.output_path
+        """
+        output_sink = get_output_sink()
+        if not output_sink.supports_partial_builds:
+            changed_files = None
+
+        # The first build needs every entry in the context, even if only some files changed
+        context_changed_files = changed_files if self.has_generated else None
+
         """
         Build a rendering context from the content
         """
         logger.info("Building context...")
 
-        for file_path in get_files_in_path(config.content_path, changed_files):
+        for file_path in get_content_source().get_files(context_changed_files):
             entry_uri = str(file_path)
             self.context["entries"][entry_uri] = {"entry_uri": entry_uri}
 
         for context_processor in self.context_processors:
-            context_processor.process(self.context, changed_files)
+            context_processor.process(self.context, context_changed_files)
 
         """
         Render entries and other templates
         """
+        # The fingerprinted path of each asset, by original path. Filled by the renderers, for asset_url().
+        self.context["asset_manifest"] = {}
+
+        # The output files of the renderers that already ran
         files_to_keep = set()
+        self.context["output_files"] = files_to_keep
+
         for renderer in self.renderers:
             logger.debug(f"Rendering entries with {type(renderer).__name__}")
             files_to_keep.update(renderer.render(self.context, changed_files))
 
+        self.delete_stale_files(files_to_keep)
+
+        if config.shard:
+            self.write_shard_manifest(files_to_keep)
+
+        output_sink.close()
+        self.has_generated = True
+        logger.info("Done.")
+        return files_to_keep
+
+    def delete_stale_files(self, files_to_keep: set[Path]) -> None:
         """
         Delete output files that are not explicitly part of this build, because they are stale.
         """
-        for file in config.output_path.rglob("*"):
-            if (
-                file.is_file()
-                and file.relative_to(config.output_path) not in files_to_keep
-            ):
-                logger.warning(
-                    f"Deleting stale output file {str(file.relative_to(config.output_path))}"
-                )
-                file.unlink()
+        output_sink = get_output_sink()
+        for file in list(output_sink.list_files()):
+            if file not in files_to_keep:
+                logger.warning(f"Deleting stale output file {str(file)}")
+                output_sink.delete(file)
+
+    def write_shard_manifest(self, files_to_keep: set[Path]) -> None:
+        """
+        Lists the output files of this shard in a .json file next to its output directory. `ursus merge` copies these
+        files to the website's output_path.
+        """
+        shard_number, shard_count = config.shard
+        manifest = {
+            "shard": shard_number,
+            "shard_count": shard_count,
+            "files": sorted(str(path) for path in files_to_keep),
+        }
+        with config.output_path.with_name(config.output_path.name + ".json").open("w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+    def merge_shards(self) -> set[Path]:
+        """
+        Combines the output of all shards in config.output_path, and deletes stale output files.
+
+        Returns:
+            set: The output files of the website, relative to config.output_path
+        """
+        manifest_paths = sorted(config.output_path.parent.glob(f"{config.output_path.name}.shard-*-of-*.json"))
+        manifests = [json.loads(path.read_text()) for path in manifest_paths]
+        shard_counts = {manifest["shard_count"] for manifest in manifests}
+        if len(shard_counts) != 1:
+            raise ValueError(f"Expected the manifests of one sharded build next to {config.output_path}")
+
+        shard_count = shard_counts.pop()
+        shard_numbers = sorted(manifest["shard"] for manifest in manifests)
+        if shard_numbers != list(range(1, shard_count + 1)):
+            raise ValueError(f"Expected {shard_count} shards, but found shards {shard_numbers}")
 
+        files_to_keep = set()
+        shard_output_paths = []
+        output_sink = get_output_sink()
+        for manifest in sorted(manifests, key=lambda manifest: manifest["shard"]):
+            shard_output_path = get_shard_output_path(config.output_path, manifest["shard"], shard_count)
+            shard_output_paths.append(shard_output_path)
+            logger.info("Merging %s", shard_output_path.name)
+            for file in map(Path, manifest["files"]):
+                abs_shard_file_path = shard_output_path / file
+                if output_sink.get_file_hash(file) != get_file_hash(abs_shard_file_path):
+                    output_sink.delete(file)
+                    output_sink.copy_file(abs_shard_file_path, file)
+                files_to_keep.add(file)
+
+        for renderer in self.renderers:
+            files_to_keep.update(renderer.merge_shards(shard_output_paths))
+
+        self.delete_stale_files(files_to_keep)
+        output_sink.close()
         logger.info("Done.")
+        return files_to_keep
+
+    def get_build_settings_hash(self) -> str:
+        """
+        Returns:
+            str: A hash of the Ursus version and of the config. If it changes, the next incremental build is a full
+                build.
+        """
+        try:
+            ursus_version = metadata.version("ursus_ssg")
+        except metadata.PackageNotFoundError:
+            ursus_version = None
+        settings = get_stable_repr([ursus_version, vars(config)])
+        return hashlib.sha256(settings.encode()).hexdigest()
+
+    def get_source_hashes(self) -> dict[Path, str]:
+        """
+        Returns:
+            dict: The content hash of each content file and of each file in config.templates_path
+        """
+        content_source = get_content_source()
+        return {
+            **{
+                config.content_path / path: content_source.get_file_hash(config.content_path / path)
+                for path in content_source.get_files()
+            },
+            **{path: get_file_hash(path) for path in config.templates_path.rglob("*") if path.is_file()},
+        }
+
+    def get_changed_files(self, source_hashes: dict[Path, str]) -> set[Path] | None:
+        """
+        Returns:
+            set: The source files that were created, changed or deleted since the last successful build, or None if
+                the whole website must be rebuilt.
+        """
+        last_build = self.build_cache.get(str(config.output_path))
+        if last_build is None:
+            logger.info("No previous build found. Building everything.")
+            return None
+        elif last_build["settings_hash"] != self.get_build_settings_hash():
+            logger.info("The config or the Ursus version changed since the last build. Building everything.")
+            return None
+        elif not all(get_output_sink().exists(path) for path in last_build["output_files"]):
+            logger.info("Output files are missing. Building everything.")
+            return None
+
+        previous_hashes = last_build["source_hashes"]
+        return {
+            path
+            for path in source_hashes.keys() | previous_hashes.keys()
+            if source_hashes.get(path) != previous_hashes.get(path)
+        }
+
+    def generate_incremental(self) -> set[Path]:
+        """
+        Builds the website, but only renders again the files affected by the changes since the last successful
+        build. The state of the last build is kept in config.cache_path.
+
+        Returns:
+            set: The output files of the website, relative to config.output_path
+        """
+        if not config.persistent_cache:
+            logger.warning("Incremental builds require config.persistent_cache. Building everything.")
+            return self.generate()
+
+        # Read the sources before building, so that changes made during the build are part of the next build
+        source_hashes = self.get_source_hashes()
+        changed_files = self.get_changed_files(source_hashes)
+        if changed_files is not None:
+            logger.info("%i files changed since the last build.", len(changed_files))
+
+        output_files = self.generate(changed_files)
+        self.build_cache.set(
+            str(config.output_path),
+            {
+                "settings_hash": self.get_build_settings_hash(),
+                "source_hashes": source_hashes,
+                "output_files": output_files,
+            },
+        )
+        return output_files
+
+    def get_output_hashes(self) -> dict[Path, str]:
+        """
+        Returns:
+            dict: The content hash of each output file, by path relative to config.output_path
+        """
+        output_sink = get_output_sink()
+        return {path: output_sink.get_file_hash(path) for path in output_sink.list_files()}
+
+    def generate_since(self, git_ref: str) -> dict[str, list[str]]:
+        """
+        Builds the website, but only renders again the files affected by the changes since a git commit.
+
+        Args:
+            git_ref (str): A git commit, branch or tag. For example, the last deployed commit.
+        Returns:
+            dict: The output files that were "created", "modified" and "deleted" by this build, relative to
+                config.output_path
+        """
+        output_sink = get_output_sink()
+        if not output_sink.supports_partial_builds:
+            # The output is written from scratch, and can't be compared with the previous output
+            sink_name = type(output_sink).__name__
+            raise ValueError(f"--since can't be used with {sink_name}, because it does not support partial builds")
+
+        changed_files = get_git_changed_files(git_ref)
+        logger.info("%i files changed since %s.", len(changed_files), git_ref)
+
+        previous_hashes = self.get_output_hashes()
+        self.generate(changed_files)
+        output_hashes = self.get_output_hashes()
+
+        return {
+            "created": sorted(str(path) for path in output_hashes.keys() - previous_hashes.keys()),
+            "modified": sorted(
+                str(path)
+                for path in output_hashes.keys() & previous_hashes.keys()
+                if output_hashes[path] != previous_hashes[path]
+            ),
+            "deleted": sorted(str(path) for path in previous_hashes.keys() - output_hashes.keys()),
+        }
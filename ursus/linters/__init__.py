@@ -1,6 +1,8 @@
 from pathlib import Path
 from typing import Generator, Match
 from ursus.config import config
+from ursus.sources import get_content_source
+import io
 import logging
 import re
 
@@ -33,10 +35,10 @@ class LineLinter(Linter):
         if self.file_suffixes and file_path.suffix.lower() not in self.file_suffixes:
             return
 
-        with (config.content_path / file_path).open() as file:
-            for line_no, line in enumerate(file.readlines()):
-                for col_range, error, level in self.lint_line(file_path, line):
-                    yield (line_no, *col_range), error, level
+        lines = io.StringIO(get_content_source().read_text(config.content_path / file_path)).readlines()
+        for line_no, line in enumerate(lines):
+            for col_range, error, level in self.lint_line(file_path, line):
+                yield (line_no, *col_range), error, level
 
     def lint_line(self, file_path: Path, line: str) -> LineLinterResult:
         raise NotImplementedError
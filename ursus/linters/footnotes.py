@@ -1,6 +1,8 @@
 from pathlib import Path
 from ursus.config import config
 from ursus.linters import RegexLinter, LinterResult
+from ursus.sources import get_content_source
+import io
 import logging
 import re
 
@@ -19,16 +21,16 @@ class OrphanFootnotesLinter(RegexLinter):
 
         footnotes: dict[str, list[dict]] = {}
 
-        with (config.content_path / file_path).open() as file:
-            for line_no, line in enumerate(file.readlines()):
-                for match in self.regex.finditer(line):
-                    footnotes.setdefault(match["id"], [])
-                    footnotes[match["id"]].append(
-                        {
-                            "position": (line_no, *match.span()),
-                            "is_definition": bool(match["colon"]),
-                        }
-                    )
+        lines = io.StringIO(get_content_source().read_text(config.content_path / file_path)).readlines()
+        for line_no, line in enumerate(lines):
+            for match in self.regex.finditer(line):
+                footnotes.setdefault(match["id"], [])
+                footnotes[match["id"]].append(
+                    {
+                        "position": (line_no, *match.span()),
+                        "is_definition": bool(match["colon"]),
+                    }
+                )
 
         for footnote_id, occurences in footnotes.items():
             definitions = [o for o in occurences if o["is_definition"]]
@@ -2,7 +2,9 @@ from pathlib import Path
 from ursus.config import config
 from ursus.linters import Linter, LinterResult
 from ursus.linters.markdown import MarkdownLinksLinter
-from ursus.utils import is_image, get_files_in_path
+from ursus.sources import get_content_source
+from ursus.utils import is_image
+import io
 import logging
 
 
@@ -18,12 +20,12 @@ class UnusedImagesLinter(Linter):
 
         link_regex = MarkdownLinksLinter.regex
 
-        for markdown_path in get_files_in_path(config.content_path, suffix=".md"):
-            with (config.content_path / markdown_path).open() as file:
-                for line_no, line in enumerate(file.readlines()):
-                    for match in link_regex.finditer(line):
-                        entry_uri = match["url"].removeprefix("/")
-                        self.all_entry_links.add(entry_uri)
+        content_source = get_content_source()
+        for markdown_path in content_source.get_files(suffix=".md"):
+            for line in io.StringIO(content_source.read_text(config.content_path / markdown_path)):
+                for match in link_regex.finditer(line):
+                    entry_uri = match["url"].removeprefix("/")
+                    self.all_entry_links.add(entry_uri)
 
     def lint(self, file_path: Path) -> LinterResult:
         if (
@@ -6,7 +6,9 @@ from typing import Any, Match, List, Tuple
 from urllib.parse import unquote, urlparse
 from ursus.config import config
 from ursus.linters import Linter, LinterResult, MatchResult, RegexLinter
+from ursus.sources import get_content_source
 from ursus.utils import parse_markdown_head_matter
+import io
 import logging
 import re
 import requests
@@ -136,14 +138,13 @@ class MarkdownInternalLinksLinter(MarkdownLinksLinter):
     def get_title_slugs(self, file_path: Path):
         if file_path not in self.title_slugs_cache:
             self.title_slugs_cache[file_path] = set()
-            with file_path.open() as file:
-                for line in file.readlines():
-                    if bool(self.header_regex.search(line)):
-                        self.title_slugs_cache[file_path].add(
-                            config.markdown_extensions["toc"]["slugify"](
-                                line.lstrip("#").strip(), "-"
-                            )
+            for line in io.StringIO(get_content_source().read_text(file_path)):
+                if bool(self.header_regex.search(line)):
+                    self.title_slugs_cache[file_path].add(
+                        config.markdown_extensions["toc"]["slugify"](
+                            line.lstrip("#").strip(), "-"
                         )
+                    )
         return self.title_slugs_cache[file_path]
 
     def validate_link_url(self, url: str, is_image: bool, current_file_path: Path):
@@ -171,7 +172,7 @@ class MarkdownInternalLinksLinter(MarkdownLinksLinter):
         if file_path.suffix.lower() == config.html_url_extension:
             file_path = file_path.with_suffix(".md")
 
-        if not file_path.exists():
+        if not get_content_source().exists(file_path):
             yield "Entry not found", logging.ERROR
         elif title_slug and title_slug not in self.get_title_slugs(file_path):
             yield "URL fragment not found", logging.ERROR
@@ -185,8 +186,8 @@ class HeadMatterLinter(Linter):
         meta: dict[str, Any] = {}
         field_positions: dict[str, Tuple[int, int, int]] = {}
 
-        with (config.content_path / file_path).open() as file:
-            meta, field_positions = parse_markdown_head_matter(file.readlines())
+        lines = io.StringIO(get_content_source().read_text(config.content_path / file_path)).readlines()
+        meta, field_positions = parse_markdown_head_matter(lines)
 
         yield from self.lint_meta(file_path, meta, field_positions)
 
@@ -210,7 +211,7 @@ class RelatedEntriesLinter(HeadMatterLinter):
             if key.startswith("related_"):
                 values = meta[key] if isinstance(meta[key], list) else [meta[key]]
                 for pos, entry_uri in enumerate(values):
-                    if not (config.content_path / entry_uri).exists():
+                    if not get_content_source().exists(config.content_path / entry_uri):
                         line_no, col, end_col = field_positions[key]
                         line_no += pos
                         yield (
@@ -6,7 +6,7 @@ class Renderer:
     def render(
         self, context: Context, changed_files: set[Path] | None = None
     ) -> set[Path]:
-        """Creates, updates or touches files in output_path
+        """Creates, updates or touches files in the output sink (see ursus.sinks.get_output_sink)
 
         Args:
             context (dict): Context used to render this file
@@ -20,3 +20,14 @@ class Renderer:
             NotImplementedError: Description
         """
         raise NotImplementedError
+
+    def merge_shards(self, shard_output_paths: list[Path]) -> set[Path]:
+        """Combines the output of shards that can't just be copied to output_path, for example a global index.
+        Called by `ursus merge`, after the output of all shards is copied to output_path.
+
+        Args:
+            shard_output_paths (list): The output directories of all shards
+        Returns:
+            set: List of output files that should be preserved.
+        """
+        return set()
@@ -1,62 +1,333 @@
+from collections import OrderedDict
+from functools import partial
 from pathlib import Path
 from PIL import Image
+from PIL.Image import Image as ImageType
+from typing import BinaryIO, Callable
+from ursus.cache import Cache
 from ursus.config import config
 from ursus.context_processors import Context
 from ursus.renderers import Renderer
+from ursus.sinks import get_output_sink
+from ursus.sources import get_content_source
 from ursus.utils import (
+    get_image_encoder_profile,
     make_image_thumbnail,
-    make_pdf_thumbnail,
+    render_pdf_page,
     is_pdf,
     is_svg,
-    copy_file,
+    is_in_shard,
 )
+import fitz
+import hashlib
+import json
 import logging
+import threading
 
 
 logger = logging.getLogger(__name__)
 
 
+class ImageTransformQueue:
+    """
+    Image transforms that are rendered later, when config.lazy_image_transforms is True. They are rendered one by one
+    in a background thread, or immediately when they are requested by the server.
+    """
+
+    def __init__(self):
+        self.jobs: OrderedDict[Path, Callable[[], None]] = OrderedDict()
+        self.condition = threading.Condition()
+        self.render_lock = threading.RLock()
+        self.current_output_path: Path | None = None
+        self.worker: threading.Thread | None = None
+
+    def add(self, output_path: Path, job: Callable[[], None]) -> None:
+        """
+        Args:
+            output_path (Path): The path of the output file, relative to config.output_path
+            job (Callable): Renders the output file
+        """
+        with self.condition:
+            self.jobs[output_path] = job
+            self.condition.notify()
+
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.work, daemon=True)
+                self.worker.start()
+
+    def run(self, output_path: Path, job: Callable[[], None]) -> None:
+        with self.render_lock:
+            try:
+                job()
+            except:
+                logger.exception("Could not render %s", str(output_path))
+
+    def render(self, output_path: Path) -> bool:
+        """
+        Renders an output file now, if it's queued.
+
+        Args:
+            output_path (Path): The path of the output file, relative to config.output_path
+        Returns:
+            bool: Whether the file was queued
+        """
+        with self.condition:
+            job = self.jobs.pop(output_path, None)
+            is_rendering = self.current_output_path == output_path
+
+        if job:
+            self.run(output_path, job)
+        elif is_rendering:
+            # Wait until the background thread is done rendering it
+            with self.render_lock:
+                pass
+        return bool(job) or is_rendering
+
+    def work(self) -> None:
+        while True:
+            with self.condition:
+                while not self.jobs:
+                    self.condition.wait()
+                output_path, job = self.jobs.popitem(last=False)
+                self.current_output_path = output_path
+
+            self.run(output_path, job)
+
+            with self.condition:
+                self.current_output_path = None
+
+
+image_transform_queue = ImageTransformQueue()
+
+
 class ImageTransformRenderer(Renderer):
     """
     Resizes images and generate PDF thumbnails
+
+    Rendered images are kept in config.cache_path. They are identified by the hash of the original image and by the
+    transform settings. If an image was already rendered with the same settings, it's copied from the cache instead of
+    being rendered again.
+
+    If config.lazy_image_transforms is True, new images are not rendered immediately. They are added to
+    image_transform_queue instead. This requires an output sink that supports partial builds.
     """
 
+    def __init__(self):
+        super().__init__()
+
+        # The variant key of each file in output_path, to know if the file is up to date
+        self.output_variant_keys = Cache("image_transform_outputs")
+
+        # The PDF being rendered, and its first page rendered at different sizes. They are shared by all transforms of
+        # the same PDF, so that each PDF is opened once, and each size is only rasterised once. Queued transforms are
+        # rendered in another thread, so each thread has its own.
+        self.pdf = threading.local()
+
+    def get_variant_key(self, abs_file_path: Path, transform: dict) -> str:
+        """
+        Returns a key that identifies the result of a transform. If the key is unchanged, the result is unchanged.
+        """
+        output_suffix = transform["output_path"].suffix.lower()
+        variant_settings = {
+            "source": get_content_source().get_file_hash(abs_file_path),
+            "max_size": transform.get("max_size"),
+            "output_suffix": output_suffix,
+            "encoder_profile": get_image_encoder_profile(),
+        }
+        return hashlib.sha256(json.dumps(variant_settings, sort_keys=True).encode()).hexdigest()
+
+    def get_cached_variant_path(self, variant_key: str, output_suffix: str) -> Path:
+        return config.cache_path / "image_transforms" / variant_key[:2] / (variant_key + output_suffix)
+
+    def get_pdf_page_image(self, abs_file_path: Path, max_size) -> ImageType:
+        if getattr(self.pdf, "document", None) is None:
+            content_source = get_content_source()
+            local_path = content_source.get_local_path(abs_file_path)
+            if local_path:
+                self.pdf.document = fitz.open(local_path)
+            else:
+                self.pdf.document = fitz.open(stream=content_source.read_bytes(abs_file_path), filetype="pdf")
+            self.pdf.page_images = {}
+        if tuple(max_size) not in self.pdf.page_images:
+            self.pdf.page_images[tuple(max_size)] = render_pdf_page(self.pdf.document, max_size)
+        return self.pdf.page_images[tuple(max_size)]
+
+    def close_pdf(self) -> None:
+        if getattr(self.pdf, "document", None) is not None:
+            self.pdf.document.close()
+        self.pdf.document = None
+        self.pdf.page_images = {}
+
+    def is_up_to_date(self, output_path: Path, variant_key: str) -> bool:
+        """
+        Without config.persistent_cache, the variant keys are forgotten when Ursus exits, so the first build of each
+        run renders every image again. The output files can't tell which settings they were rendered with.
+        """
+        output_sink = get_output_sink()
+        return output_sink.exists(output_path) and self.output_variant_keys.get(
+            str(config.output_path / output_path)
+        ) == (variant_key, output_sink.get_fingerprint(output_path))
+
+    def set_up_to_date(self, output_path: Path, variant_key: str) -> None:
+        self.output_variant_keys.set(
+            str(config.output_path / output_path), (variant_key, get_output_sink().get_fingerprint(output_path))
+        )
+
+    def render_duplicate_transform(self, transform: dict) -> None:
+        """
+        Links the output of a transform to the identical output of another transform, instead of rendering it again.
+        """
+        output_sink = get_output_sink()
+        output_path = transform["output_path"]
+        original_output_path = transform["duplicate_of"]
+
+        if not output_sink.exists(original_output_path):
+            # The original output is still queued
+            image_transform_queue.add(output_path, partial(self.render_queued_duplicate, transform))
+        elif not output_sink.exists(output_path) or (
+            output_sink.get_fingerprint(output_path) != output_sink.get_fingerprint(original_output_path)
+        ):
+            logger.info("Linking %s to %s", str(output_path), str(original_output_path))
+            output_sink.delete(output_path)
+            output_sink.duplicate(original_output_path, output_path)
+
+    def render_queued_duplicate(self, transform: dict) -> None:
+        image_transform_queue.render(transform["duplicate_of"])
+        if get_output_sink().exists(transform["duplicate_of"]):
+            self.render_duplicate_transform(transform)
+
+    def encode_transform(self, abs_file_path: Path, transform: dict, variant_key: str) -> None:
+        entry_uri = abs_file_path.relative_to(config.content_path)
+        output_path = transform["output_path"]
+        max_size = transform.get("max_size")  # Optional for PDFs and SVGs
+        output_sink = get_output_sink()
+
+        if is_pdf(abs_file_path):
+            logger.info(
+                "Generating %s preview as %s",
+                entry_uri,
+                str(output_path),
+            )
+        else:
+            logger.info("Converting %s to %s", entry_uri, str(output_path))
+
+        if config.persistent_cache:
+            # Render the image in the cache, and link the output file to it. The cached image might be linked to
+            # other output files. Replace it instead of overwriting it.
+            cached_variant_path = self.get_cached_variant_path(variant_key, output_path.suffix.lower())
+            cached_variant_path.unlink(missing_ok=True)
+            self.encode_image(abs_file_path, max_size, cached_variant_path)
+            output_sink.link_file(cached_variant_path, output_path)
+        else:
+            with output_sink.open(output_path) as output_file:
+                self.encode_image(abs_file_path, max_size, output_path, output_file)
+
+        self.set_up_to_date(output_path, variant_key)
+
+    def encode_image(
+        self, abs_file_path: Path, max_size, output_path: Path, output_file: BinaryIO | None = None
+    ) -> None:
+        if is_pdf(abs_file_path):
+            # make_image_thumbnail() resizes the image in place. The page image is reused by other transforms.
+            page_image = self.get_pdf_page_image(abs_file_path, max_size).copy()
+            make_image_thumbnail(page_image, max_size, output_path, output_file)
+        else:
+            with get_content_source().open(abs_file_path) as file, Image.open(file) as pil_image:
+                make_image_thumbnail(pil_image, max_size, output_path, output_file)
+
+    def encode_queued_transform(self, abs_file_path: Path, transform: dict, variant_key: str) -> None:
+        try:
+            if get_content_source().is_file(abs_file_path):
+                self.encode_transform(abs_file_path, transform, variant_key)
+        finally:
+            self.close_pdf()
+
+    def render_transform(self, abs_file_path: Path, transform: dict) -> None:
+        entry_uri = abs_file_path.relative_to(config.content_path)
+        output_path = transform["output_path"]
+        output_sink = get_output_sink()
+
+        variant_key = self.get_variant_key(abs_file_path, transform)
+        if self.is_up_to_date(output_path, variant_key):
+            return
+
+        # The output file might be linked to a cached variant. Replace it instead of overwriting it.
+        output_sink.delete(output_path)
+
+        is_copy = is_svg(abs_file_path) or (is_pdf(abs_file_path) and output_path.suffix.lower() == ".pdf")
+        cached_variant_path = self.get_cached_variant_path(variant_key, output_path.suffix.lower())
+
+        if is_copy:
+            logger.info("Copying %s to %s", entry_uri, str(output_path))
+            get_content_source().copy_to_output(abs_file_path, output_path)
+        elif config.persistent_cache and cached_variant_path.exists():
+            logger.info("Restoring %s from cache", str(output_path))
+            output_sink.link_file(cached_variant_path, output_path)
+        elif config.lazy_image_transforms and output_sink.supports_partial_builds:
+            # Output sinks without partial builds are closed at the end of the build, so the image can't be written
+            # later by the background thread
+            logger.debug("Queueing %s", str(output_path))
+            image_transform_queue.add(
+                output_path, partial(self.encode_queued_transform, abs_file_path, transform, variant_key)
+            )
+            return
+        else:
+            self.encode_transform(abs_file_path, transform, variant_key)
+            return
+
+        self.set_up_to_date(output_path, variant_key)
+
+    def evict_cached_variants(self) -> None:
+        """
+        Deletes the oldest images in the cache, until the cache is smaller than config.image_transform_cache_size.
+        Images that are hard linked to output files are still in use, and are not deleted.
+        """
+        cache_size = config.image_transform_cache_size
+        cached_variants_path = config.cache_path / "image_transforms"
+        if cache_size is None or not cached_variants_path.exists():
+            return
+
+        cached_variants = []
+        total_size = 0
+        for path in cached_variants_path.glob("*/*"):
+            stat = path.stat()
+            cached_variants.append((stat.st_mtime_ns, stat.st_size, stat.st_nlink, path))
+            total_size += stat.st_size
+
+        cached_variants.sort()
+        for mtime, size, nlink, path in cached_variants:
+            if total_size <= cache_size:
+                break
+            if nlink == 1:
+                logger.debug("Evicting %s from cache", str(path))
+                path.unlink(missing_ok=True)
+                total_size -= size
+
     def render(self, context: Context, changed_files: set[Path] | None = None) -> set[Path]:
         logger.info("Rendering image transforms...")
 
         files_to_keep = set()
 
         for entry_uri, entry in context["entries"].items():
+            # All transforms of an image are in the same shard, because duplicate transforms are linked to each other
+            if not is_in_shard(entry_uri):
+                continue
+
             abs_file_path = config.content_path / entry_uri
 
             for transform in entry.get("transforms", []):
-                output_path = transform["output_path"]
-                abs_output_path = config.output_path / output_path
-                max_size = transform.get("max_size")  # Optional for PDFs and SVGs
-
                 has_changed = changed_files is None or abs_file_path in changed_files
-                if has_changed and (
-                    (not abs_output_path.exists()) or abs_file_path.stat().st_mtime > abs_output_path.stat().st_mtime
-                ):
-                    if is_pdf(abs_file_path):
-                        if abs_output_path.suffix.lower() == ".pdf":
-                            logger.info("Copying %s to %s", entry_uri, str(output_path))
-                            copy_file(abs_file_path, abs_output_path)
-                        else:
-                            logger.info(
-                                "Generating %s preview as %s",
-                                entry_uri,
-                                str(output_path),
-                            )
-                            make_pdf_thumbnail(abs_file_path, max_size, abs_output_path)
-                    elif is_svg(abs_file_path):
-                        logger.info("Copying %s to %s", entry_uri, str(output_path))
-                        copy_file(abs_file_path, abs_output_path)
+                if has_changed:
+                    if transform.get("duplicate_of"):
+                        self.render_duplicate_transform(transform)
                     else:
-                        logger.info("Converting %s to %s", entry_uri, str(output_path))
-                        with Image.open(abs_file_path) as pil_image:
-                            make_image_thumbnail(pil_image, max_size, abs_output_path)
+                        self.render_transform(abs_file_path, transform)
+
+                files_to_keep.add(transform["output_path"])
+
+            self.close_pdf()
 
-                files_to_keep.add(output_path)
+        if config.persistent_cache and changed_files is None:
+            self.evict_cached_variants()
 
         return files_to_keep
@@ -1,25 +1,37 @@
 from jinja2 import (
+    BytecodeCache,
     Environment,
+    FileSystemBytecodeCache,
     FileSystemLoader,
     nodes,
     pass_context,
     select_autoescape,
     StrictUndefined,
+    TemplateSyntaxError,
 )
 from jinja2.ext import Extension
+from jinja2.lexer import newline_re
 from jinja2.meta import find_referenced_templates
+from jinja2.utils import LRUCache
 from jinja2_simple_tags import StandaloneTag, ContainerTag
 from markdown.serializers import to_html_string
-from markupsafe import Markup
+from markupsafe import escape, Markup
 from ordered_set import OrderedSet
 from pathlib import Path
 from rcssmin import cssmin
 from rjsmin import jsmin
-from typing import Generator
+from typing import Generator, Iterable
+from ursus.cache import Cache, get_file_fingerprint, get_file_hash
 from ursus.config import config
 from ursus.context_processors import Context, EntryURI
 from ursus.renderers import Renderer
-from ursus.utils import get_files_in_path, make_picture_element, is_ignored_file
+from ursus.renderers.sass import SassRenderer, get_scss_imports, resolve_scss_import
+from ursus.sinks import get_output_sink
+from ursus.sources import get_content_source
+from ursus.utils import get_files_in_path, make_picture_element, is_ignored_file, is_in_shard
+import hashlib
+import jinja2
+import json
 import logging
 import sass
 
@@ -27,21 +39,36 @@ import sass
 logger = logging.getLogger(__name__)
 
 
+# The maximum number of minified {% alljs %} and {% allCss %} outputs kept by each fragment loader extension
+minified_code_cache_size = 100
+
+
 class FragmentLoaderExtension(Extension):
     """
     Base class for {% tag %}/{% allTag %} queue-and-render extensions.
 
-    Subclasses define `tags`, `render_tag`, and `fragments_attr`, and override
-    `should_minify()` and `minify()`.
+    Subclasses define `tags`, `render_tag`, `fragments_attr` and `bundle_suffix`, and override
+    `should_minify()`, `minify()` and `render_bundle_tag()`.
+
+    Most pages output the same code, so the most recently minified code is remembered. If
+    config.fragment_bundle_path is set, the code is saved to a file instead, and a tag that loads
+    this file is output.
     """
 
     render_tag: str
     fragments_attr: str
+    bundle_suffix: str
 
     def __init__(self, environment):
         super().__init__(environment)
         environment.extend(**{self.fragments_attr: OrderedSet()})
 
+        # Minified code, by hash of the unminified code
+        self.minified_code_cache = LRUCache(minified_code_cache_size)
+
+        # The bundle files written by this extension, relative to config.output_path
+        self.bundle_paths: set[Path] = set()
+
     def parse(self, parser):
         token = next(parser.stream)
 
@@ -58,12 +85,41 @@ class FragmentLoaderExtension(Extension):
     def minify(self, code: str) -> str:
         return code
 
+    def render_bundle_tag(self, bundle_url: str) -> str:
+        raise NotImplementedError
+
+    def get_minified_code(self, code: str) -> str:
+        code_hash = hashlib.sha256(code.encode()).hexdigest()
+        minified_code = self.minified_code_cache.get(code_hash)
+        if minified_code is None:
+            minified_code = self.minify(code)
+            self.minified_code_cache[code_hash] = minified_code
+        return minified_code
+
+    def write_bundle(self, code: str) -> Path:
+        """
+        Saves the code to a file named after its hash, unless it already exists.
+
+        Returns:
+            Path: The path of the bundle file, relative to config.output_path
+        """
+        bundle_name = hashlib.sha256(code.encode()).hexdigest()[:16] + self.bundle_suffix
+        bundle_path = config.fragment_bundle_path / bundle_name
+        output_sink = get_output_sink()
+        if bundle_path not in self.bundle_paths or not output_sink.exists(bundle_path):
+            logger.info("Rendering %s", str(bundle_path))
+            output_sink.write_text(bundle_path, code)
+            self.bundle_paths.add(bundle_path)
+        return bundle_path
+
     def _render(self, caller):
         fragments = getattr(self.environment, self.fragments_attr)
         output = "\n".join(fragments)
-        if self.should_minify():
-            output = self.minify(output)
         fragments.clear()
+        if self.should_minify():
+            output = self.get_minified_code(output)
+        if config.fragment_bundle_path and output.strip():
+            return Markup(self.render_bundle_tag(f"{config.site_url}/{str(self.write_bundle(output))}"))
         return Markup(output)
 
     def _queue(self, caller):
@@ -86,6 +142,7 @@ class JsLoaderExtension(FragmentLoaderExtension):
     tags = {"js", "queueJs", "alljs"}
     render_tag = "alljs"
     fragments_attr = "js_fragments"
+    bundle_suffix = ".js"
 
     def should_minify(self) -> bool:
         return config.minify_js
@@ -93,6 +150,9 @@ class JsLoaderExtension(FragmentLoaderExtension):
     def minify(self, code: str) -> str:
         return str(jsmin(code))
 
+    def render_bundle_tag(self, bundle_url: str) -> str:
+        return f'<script src="{escape(bundle_url)}"></script>'
+
 
 class CssLoaderExtension(FragmentLoaderExtension):
     """
@@ -109,6 +169,7 @@ class CssLoaderExtension(FragmentLoaderExtension):
     tags = {"css", "queueCss", "allCss"}
     render_tag = "allCss"
     fragments_attr = "css_fragments"
+    bundle_suffix = ".css"
 
     def should_minify(self) -> bool:
         return config.minify_css
@@ -116,6 +177,9 @@ class CssLoaderExtension(FragmentLoaderExtension):
     def minify(self, code: str) -> str:
         return str(cssmin(code))
 
+    def render_bundle_tag(self, bundle_url: str) -> str:
+        return f'<link rel="stylesheet" href="{escape(bundle_url)}">'
+
 
 class ScssLoaderExtension(ContainerTag):
     """
@@ -123,6 +187,10 @@ class ScssLoaderExtension(ContainerTag):
 
     All Sass code in {% scss %} tags is converted to CSS.
     It's also minified if config.minify_css is True.
+
+    The compiled CSS is cached in config.cache_path. It's compiled again if the Sass code, the output style or the
+    files it imports change. The cache key of each block is computed once per build, because the same block is
+    rendered on many pages. JinjaRenderer calls invalidate() when Sass files change.
     """
 
     tags = {"scss"}
@@ -130,18 +198,149 @@ class ScssLoaderExtension(ContainerTag):
 
     def __init__(self, *args, **kwargs):
         self.scss_cache = {}
+        self.compiled_css_cache = Cache("scss_blocks")
+
+        # The cache key of each block, by (Sass code, output style)
+        self.cache_keys: dict[tuple[str, str], str] = {}
+
+        # Tracks the files imported by the blocks, like it does for .scss files
+        self.sass_renderer = SassRenderer()
+
+    def invalidate(self, changed_files: set[Path] | None = None) -> None:
+        """Forgets the cache keys that could have changed. A new Sass file can change which file a block imports."""
+        if changed_files is None or any(file.suffix in (".scss", ".sass") for file in changed_files):
+            self.cache_keys.clear()
+
+    def get_cache_key(self, scss_code: str, output_style: str) -> str:
+        if (scss_code, output_style) not in self.cache_keys:
+            dependencies = set()
+            for import_path in get_scss_imports(scss_code):
+                abs_import_path = resolve_scss_import(import_path, config.templates_path)
+                if abs_import_path:
+                    dependencies.update(self.sass_renderer.get_dependencies(abs_import_path))
+
+            self.cache_keys[(scss_code, output_style)] = hashlib.sha256(
+                json.dumps(
+                    {
+                        "scss_code": scss_code,
+                        "output_style": output_style,
+                        "include_paths": [str(config.templates_path)],
+                        "dependencies": sorted((str(path), get_file_hash(path)) for path in dependencies),
+                    }
+                ).encode()
+            ).hexdigest()
+        return self.cache_keys[(scss_code, output_style)]
 
     def render(self, caller):
         scss_code = caller()
-        if scss_code not in self.scss_cache:
-            self.scss_cache[scss_code] = Markup(
-                sass.compile(
+        output_style = "compressed" if config.minify_css else "nested"
+        cache_key = self.get_cache_key(scss_code, output_style)
+
+        if cache_key not in self.scss_cache:
+            compiled_css = self.compiled_css_cache.get(cache_key)
+            if compiled_css is None:
+                compiled_css = sass.compile(
                     string=scss_code,
-                    output_style="compressed" if config.minify_css else "nested",
+                    output_style=output_style,
                     include_paths=[str(config.templates_path)],
                 )
-            )
-        return self.scss_cache[scss_code]
+                self.compiled_css_cache.set(cache_key, compiled_css)
+            self.scss_cache[cache_key] = Markup(compiled_css)
+        return self.scss_cache[cache_key]
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Jinja extension. Adds the {% cache %} tag.
+
+    Usage: {% cache "navigation", "posts", "pages/about.md", "_nav.html.jinja" %}...{% endcache %}
+
+    The content of the tag is rendered once, then the same output is used everywhere the tag is used with the same
+    key. The other arguments are the dependencies of the output: entry URIs, namespaces (for example "posts") or
+    template paths. In watch mode, the output is rendered again when one of its dependencies changes. Without
+    dependencies, it's rendered again on every rebuild.
+
+    The output is always rendered again when a template changes.
+
+    The code queued by {% js %} and {% css %} tags inside the block is saved with the output, and queued again
+    wherever the cached output is used.
+    """
+
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        # The rendered output, dependencies and queued fragments of each cache key
+        environment.extend(fragment_cache={})
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = parser.parse_expression()
+        dependencies = []
+        while parser.stream.skip_if("comma"):
+            dependencies.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render", [key, nodes.List(dependencies)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def depends_on(self, dependencies: list[str], changed_files: set[Path]) -> bool:
+        for file in changed_files:
+            if file.is_relative_to(config.templates_path):
+                return True
+            elif file.is_relative_to(config.content_path):
+                entry_uri = str(file.relative_to(config.content_path))
+                for dependency in dependencies:
+                    if entry_uri == dependency or entry_uri.startswith(dependency.removesuffix("/") + "/"):
+                        return True
+        return False
+
+    def invalidate(self, changed_files: set[Path] | None) -> None:
+        """
+        Forgets the output that depends on the changed files.
+
+        Args:
+            changed_files (set): The files that changed since the last render. If None, everything changed.
+        """
+        fragment_cache = self.environment.fragment_cache
+        for key, (output, dependencies, fragments) in list(fragment_cache.items()):
+            if changed_files is None or not dependencies or self.depends_on(dependencies, changed_files):
+                del fragment_cache[key]
+
+    def get_fragments_attrs(self) -> list[str]:
+        return [
+            extension.fragments_attr
+            for extension in self.environment.extensions.values()
+            if isinstance(extension, FragmentLoaderExtension)
+        ]
+
+    def render_block(self, caller) -> tuple[str, dict[str, list[str]]]:
+        """
+        Renders the block, and records the fragments it queues.
+
+        Returns:
+            tuple: The output, and the queued fragments by fragments_attr
+        """
+        queued_fragments = {attr: getattr(self.environment, attr) for attr in self.get_fragments_attrs()}
+        for attr in queued_fragments:
+            setattr(self.environment, attr, OrderedSet())
+        try:
+            output = caller()
+        finally:
+            block_fragments = {attr: list(getattr(self.environment, attr)) for attr in queued_fragments}
+            for attr, fragments in queued_fragments.items():
+                setattr(self.environment, attr, fragments)
+        return output, block_fragments
+
+    def _render(self, key, dependencies, caller):
+        key = str(key)
+        if key not in self.environment.fragment_cache:
+            output, fragments = self.render_block(caller)
+            self.environment.fragment_cache[key] = (output, [str(dependency) for dependency in dependencies], fragments)
+
+        output, dependencies, fragments = self.environment.fragment_cache[key]
+        for attr, attr_fragments in fragments.items():
+            getattr(self.environment, attr).update(attr_fragments)
+        return output
 
 
 class ResponsiveImageExtension(StandaloneTag):
@@ -168,9 +367,52 @@ class ResponsiveImageExtension(StandaloneTag):
         return to_html_string(make_picture_element(self.context, image_entry_uri, img_attrs, sizes))
 
 
+# The maximum number of compiled templates kept by the render filter
+render_filter_cache_size = 1000
+
+
 @pass_context
 def render_filter(context, value) -> str:
-    return context.eval_ctx.environment.from_string(value).render(**context)
+    """
+    Renders a string as a Jinja template. The compiled templates are cached, because the same strings (for example
+    entry bodies) are rendered on many pages.
+    """
+    environment = context.eval_ctx.environment
+
+    delimiters = (
+        environment.block_start_string,
+        environment.variable_start_string,
+        environment.comment_start_string,
+        environment.line_statement_prefix,
+        environment.line_comment_prefix,
+    )
+    if not any(delimiter in value for delimiter in delimiters if delimiter):
+        # Nothing to render. Normalise the newlines like Jinja does.
+        lines = newline_re.split(value)[::2]
+        if not environment.keep_trailing_newline and lines[-1] == "":
+            del lines[-1]
+        return environment.newline_sequence.join(lines)
+
+    if not hasattr(environment, "render_filter_cache"):
+        environment.extend(render_filter_cache=LRUCache(render_filter_cache_size))
+
+    template = environment.render_filter_cache.get(value)
+    if template is None:
+        template = environment.from_string(value)
+        environment.render_filter_cache[value] = template
+    return template.render(**context)
+
+
+@pass_context
+def asset_url(context, asset_path: str) -> str:
+    """
+    Returns the URL of a static asset or compiled stylesheet. With config.fingerprint_assets, it's the URL of the
+    fingerprinted file (see context["asset_manifest"]).
+
+    Usage: <link rel="stylesheet" href="{{ asset_url('css/style.css') }}">
+    """
+    asset_path = str(asset_path).removeprefix("/")
+    return f"{config.site_url}/{context.get('asset_manifest', {}).get(asset_path, asset_path)}"
 
 
 class JinjaRenderer(Renderer):
@@ -186,56 +428,247 @@ class JinjaRenderer(Renderer):
             extensions=config.jinja_extensions,
             autoescape=select_autoescape(),
             undefined=StrictUndefined,
+            bytecode_cache=self.get_bytecode_cache(),
         )
 
         self.template_environment.filters["render"] = render_filter
         self.template_environment.filters.update(config.jinja_filters)
+        self.template_environment.globals["asset_url"] = asset_url
 
-        self._direct_child_templates_cache = {}
+        self.index_templates(get_files_in_path(config.templates_path, suffix=".jinja"))
 
-    def get_child_templates(self, template_path: Path, changed_templates: set[Path]) -> set[Path]:
-        dependencies = set()
+        # The templates referenced by each template, the fingerprint of the template when it was parsed, and whether
+        # it has dynamic references
+        self.template_references_cache = Cache(f"jinja_template_dependencies:{self.get_parser_version()}")
+
+        # The dependency graph of the templates. It's kept in memory, and updated when templates change.
+        self.template_children: dict[Path, set[Path]] = {}  # The files referenced by each template
+        self.template_parents: dict[Path, set[Path]] = {}  # The templates that reference each file
+        self.dynamic_templates: set[Path] = set()  # The templates with dynamic references
+
+        # The asset manifest used by the pages of the last build. If it changes, every page is rendered again.
+        self.rendered_asset_manifest: dict[str, str] | None = None
+
+    def get_parser_version(self) -> str:
+        """
+        Returns:
+            str: Identifies the Jinja version and extensions used to parse and compile templates. Cached templates
+                are not used if it changes.
+        """
+        extension_names = sorted(str(extension) for extension in config.jinja_extensions)
+        return hashlib.sha256(json.dumps([jinja2.__version__, extension_names]).encode()).hexdigest()[:16]
 
-        # Parsing all the templates is slow, so we cache the list of child templates unless
-        # that template has changed.
+    def get_bytecode_cache(self) -> BytecodeCache | None:
+        """
+        Compiled templates are cached in config.cache_path, so that they are not compiled again on the next build.
+        A template is compiled again if its source changes.
+        """
+        if not (config.persistent_cache and config.jinja_bytecode_cache):
+            return None
+        bytecode_cache_path = config.cache_path / "jinja" / self.get_parser_version()
+        try:
+            bytecode_cache_path.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            logger.warning("Could not create cache directory %s. Templates are not cached.", bytecode_cache_path)
+            return None
+        return FileSystemBytecodeCache(str(bytecode_cache_path))
+
+    def get_fragment_cache_extensions(self) -> list[FragmentCacheExtension]:
+        return [
+            extension
+            for extension in self.template_environment.extensions.values()
+            if isinstance(extension, FragmentCacheExtension)
+        ]
+
+    def get_scss_loader_extensions(self) -> list[ScssLoaderExtension]:
+        return [
+            extension
+            for extension in self.template_environment.extensions.values()
+            if isinstance(extension, ScssLoaderExtension)
+        ]
+
+    def get_fragment_loader_extensions(self) -> list[FragmentLoaderExtension]:
+        return [
+            extension
+            for extension in self.template_environment.extensions.values()
+            if isinstance(extension, FragmentLoaderExtension)
+        ]
+
+    def get_template_references(self, template_path: Path) -> tuple[set[Path], bool]:
+        """
+        Returns the templates and files that a template extends, includes or imports. The result is kept in
+        config.cache_path, and the template is only parsed again if it changes.
+
+        Returns:
+            set: The referenced files, relative to config.templates_path. Files that are not valid templates (for
+                example images, or templates with a syntax error) don't reference anything.
+            bool: Whether the template also references files dynamically, for example {% include entry.template %}
+        """
+        abs_template_path = config.templates_path / template_path
+        if not abs_template_path.is_file():
+            return set(), False
 
-        if template_path in changed_templates:
-            self._direct_child_templates_cache.pop(template_path, None)
+        fingerprint = get_file_fingerprint(abs_template_path)
+        cached_references = self.template_references_cache.get(str(abs_template_path))
+        if cached_references and cached_references[0] == fingerprint:
+            return cached_references[1], cached_references[2]
 
-        if template_path not in self._direct_child_templates_cache:
-            with (config.templates_path / template_path).open() as template_file:
+        try:
+            with abs_template_path.open() as template_file:
                 ast = self.template_environment.parse(template_file.read())
-            self._direct_child_templates_cache[template_path] = set(
-                [Path(t.removeprefix("/")) for t in find_referenced_templates(ast)]
-            )
+            referenced_templates = list(find_referenced_templates(ast))
+        except (UnicodeDecodeError, TemplateSyntaxError):
+            referenced_templates = []
+        child_template_paths = set([Path(t.removeprefix("/")) for t in referenced_templates if t])
+        has_dynamic_references = None in referenced_templates
+        self.template_references_cache.set(
+            str(abs_template_path), (fingerprint, child_template_paths, has_dynamic_references)
+        )
+        return child_template_paths, has_dynamic_references
+
+    def update_template_dependencies(self, template_paths: Iterable[Path]) -> None:
+        """
+        Updates the dependency graph of the templates with the current references of these templates, and of the
+        templates they reference.
+        """
+        templates_to_visit = list(template_paths)
+        visited_templates = set()
+        while templates_to_visit:
+            template_path = templates_to_visit.pop()
+            if template_path in visited_templates:
+                continue
+            visited_templates.add(template_path)
+
+            for child_template_path in self.template_children.get(template_path, set()):
+                self.template_parents[child_template_path].discard(template_path)
+
+            child_template_paths, has_dynamic_references = self.get_template_references(template_path)
+            self.template_children[template_path] = child_template_paths
+            for child_template_path in child_template_paths:
+                self.template_parents.setdefault(child_template_path, set()).add(template_path)
+                if child_template_path not in self.template_children:
+                    templates_to_visit.append(child_template_path)
+
+            if has_dynamic_references:
+                self.dynamic_templates.add(template_path)
+            else:
+                self.dynamic_templates.discard(template_path)
 
-        child_template_paths = self._direct_child_templates_cache[template_path]
+    def get_affected_templates(self, changed_templates: set[Path]) -> set[Path]:
+        """
+        Returns:
+            set: The templates that extend, include or import the changed templates, directly or indirectly. Templates
+                that include files dynamically are always affected, because their dependencies are unknown.
+        """
+        if not self.template_children:
+            self.update_template_dependencies(self.template_paths)
+
+        # Other files (images, stylesheets...) can't reference templates. They are only parsed if a template includes
+        # them.
+        self.update_template_dependencies(
+            template_path
+            for template_path in changed_templates
+            if template_path.suffix == ".jinja" or template_path in self.template_children
+        )
 
-        for child_template_path in child_template_paths:
-            dependencies.add(child_template_path)
-            dependencies.update(self.get_child_templates(child_template_path, changed_templates))
+        affected_templates = set()
+        templates_to_visit = [*changed_templates, *self.dynamic_templates]
+        while templates_to_visit:
+            template_path = templates_to_visit.pop()
+            for parent_template_path in self.template_parents.get(template_path, set()):
+                if parent_template_path not in affected_templates:
+                    affected_templates.add(parent_template_path)
+                    templates_to_visit.append(parent_template_path)
+        affected_templates.update(self.dynamic_templates)
+        return affected_templates - changed_templates
+
+    def get_child_templates(self, template_path: Path) -> set[Path]:
+        """
+        Returns:
+            set: The templates and files that this template extends, includes or imports, directly or indirectly
+        """
+        self.update_template_dependencies([template_path])
+        dependencies = set()
+        templates_to_visit = [template_path]
+        while templates_to_visit:
+            for child_template_path in self.template_children.get(templates_to_visit.pop(), set()):
+                if child_template_path not in dependencies:
+                    dependencies.add(child_template_path)
+                    templates_to_visit.append(child_template_path)
         return dependencies
 
     def is_entry_template(self, template_path: Path) -> bool:
         return template_path.with_suffix("").stem == "entry"
 
-    def template_can_render_entry(self, template_path: Path, context: Context, entry_uri: EntryURI) -> bool:
-        entry_path = Path(entry_uri)
-        if entry_path.parent != template_path.parent:
-            return False
+    def get_template_suffixes(self, template_path: Path) -> str:
+        return "".join([template_path.with_suffix("").suffix, template_path.suffix])
+
+    def index_templates(self, template_paths: list[Path]) -> None:
+        """
+        Builds an index of the templates, so that the templates that render an entry can be found without checking
+        which files exist.
+        """
+        self.template_paths: OrderedSet[Path] = OrderedSet()
+        self.dedicated_templates: dict[tuple[Path, str], OrderedSet[Path]] = {}  # (directory, stem): templates
+        self.entry_templates: dict[Path, OrderedSet[Path]] = {}  # directory: entry templates
+        for template_path in template_paths:
+            self.index_template(template_path)
+
+    def index_template(self, template_path: Path) -> None:
+        self.template_paths.add(template_path)
+        stem = template_path.with_suffix("").stem
+        self.dedicated_templates.setdefault((template_path.parent, stem), OrderedSet()).add(template_path)
+        if self.is_entry_template(template_path):
+            self.entry_templates.setdefault(template_path.parent, OrderedSet()).add(template_path)
+
+    def unindex_template(self, template_path: Path) -> None:
+        self.template_paths.discard(template_path)
+        stem = template_path.with_suffix("").stem
+        self.dedicated_templates.get((template_path.parent, stem), OrderedSet()).discard(template_path)
+        self.entry_templates.get(template_path.parent, OrderedSet()).discard(template_path)
+
+    def update_template_index(self, changed_files: set[Path] | None) -> None:
+        """
+        Updates the template index with the templates that were added or removed.
+        """
+        if changed_files is None:
+            self.index_templates(get_files_in_path(config.templates_path, suffix=".jinja"))
+            return
 
-        is_dedicated_template_for_this_entry = template_path.with_suffix("").stem == entry_path.stem
-        if is_dedicated_template_for_this_entry:
-            return True
+        for file in changed_files:
+            if not file.is_relative_to(config.templates_path):
+                continue
+            elif file.suffix != ".jinja":
+                if file.is_dir() or not file.exists():
+                    # A directory was added, moved or removed. The templates it contains are unknown.
+                    self.index_templates(get_files_in_path(config.templates_path, suffix=".jinja"))
+                    return
+            elif file.is_file() and not is_ignored_file(file, config.templates_path):
+                self.index_template(file.relative_to(config.templates_path))
+            else:
+                self.unindex_template(file.relative_to(config.templates_path))
 
-        template_suffixes = "".join([template_path.with_suffix("").suffix, template_path.suffix])
-        entry_has_dedicated_template = (
-            config.templates_path / template_path.parent / (entry_path.stem + template_suffixes)
-        ).exists()
-        if self.is_entry_template(template_path) and not entry_has_dedicated_template:
-            return True
+    def get_entry_templates(self, entry_uri: EntryURI) -> list[Path]:
+        """
+        Returns:
+            list: The templates that render this entry. A template dedicated to this entry (for example
+                posts/hello.html.jinja) replaces the entry template with the same suffixes (posts/entry.html.jinja).
+        """
+        entry_path = Path(entry_uri)
+        dedicated_templates = self.dedicated_templates.get((entry_path.parent, entry_path.stem), OrderedSet())
+        dedicated_suffixes = {self.get_template_suffixes(template_path) for template_path in dedicated_templates}
+
+        return [
+            *dedicated_templates,
+            *[
+                template_path
+                for template_path in self.entry_templates.get(entry_path.parent, OrderedSet())
+                if self.get_template_suffixes(template_path) not in dedicated_suffixes
+            ],
+        ]
 
-        return False
+    def template_can_render_entry(self, template_path: Path, context: Context, entry_uri: EntryURI) -> bool:
+        return template_path in self.get_entry_templates(entry_uri)
 
     def render_template(self, template_path: Path, context: Context, output_path: Path) -> Generator[Path, None, None]:
         """Returns an entry into a template, and saves it under output_path
@@ -245,10 +678,9 @@ class JinjaRenderer(Renderer):
             output_path (str): Path of the generated file, relative to the output_path.
         """
         logger.info("Rendering %s", str(output_path))
-        abs_output_path = config.output_path / output_path
-        abs_output_path.parent.mkdir(parents=True, exist_ok=True)
         template = self.template_environment.get_template(str(template_path))
-        template.stream(**context).dump(str(abs_output_path))
+        with get_output_sink().open(output_path) as output_file:
+            template.stream(**context).dump(output_file, encoding="utf-8")
         yield output_path
 
     def get_entry_output_path(self, template_path: Path, entry_uri: EntryURI) -> Path:
@@ -280,41 +712,55 @@ class JinjaRenderer(Renderer):
         yield from self.render_template(template_path, specific_context, output_path)
 
     def render(self, context: Context, changed_files: set[Path] | None = None) -> set[Path]:
-        template_paths = get_files_in_path(config.templates_path, suffix=".jinja")
+        self.update_template_index(changed_files)
+        template_paths = self.template_paths
 
         render_queue: OrderedSet = OrderedSet()
         files_to_keep: set[Path] = set()
 
+        if changed_files is None:
+            # Forget bundles from previous builds. The bundles used by the pages are written again.
+            for extension in self.get_fragment_loader_extensions():
+                extension.bundle_paths.clear()
+
+        for extension in self.get_fragment_cache_extensions():
+            extension.invalidate(changed_files)
+
+        for extension in self.get_scss_loader_extensions():
+            extension.invalidate(changed_files)
+
+        # Pages that use asset_url() might refer to fingerprinted assets that were renamed
+        render_everything = not config.fast_rebuilds or (
+            config.fingerprint_assets and context.get("asset_manifest") != self.rendered_asset_manifest
+        )
+        self.rendered_asset_manifest = context.get("asset_manifest")
+
         changed_entry_uris = set()
         changed_templates = set()
 
         for file in changed_files or set():
-            if not (file.exists() and file.is_file()):
-                continue
-
-            if file.is_relative_to(config.content_path) and not is_ignored_file(file, config.content_path):
-                changed_entry_uris.add(EntryURI(str(file.relative_to(config.content_path))))
-            elif file.is_relative_to(config.templates_path):
+            if file.is_relative_to(config.content_path):
+                if get_content_source().is_file(file) and not is_ignored_file(file, config.content_path):
+                    changed_entry_uris.add(EntryURI(str(file.relative_to(config.content_path))))
+            elif file.is_relative_to(config.templates_path) and file.is_file():
                 changed_templates.add(file.relative_to(config.templates_path))
-            else:
-                continue
 
         if changed_templates and config.fast_rebuilds:
             # Also rerender templates that depend on the changed templates (for example style.css > layout.html > index.html)
-            changed_parent_templates = set()
-            for template_path in template_paths:
-                dependencies = self.get_child_templates(template_path, changed_templates)
-                for changed_template in changed_templates:
-                    if changed_template in dependencies:
-                        logger.info(f"{template_path} is affected by {changed_template} change")
-                        changed_parent_templates.add(template_path)
-            changed_templates.update(changed_parent_templates)
+            for template_path in self.get_affected_templates(changed_templates):
+                logger.info(f"{template_path} is affected by template changes")
+                changed_templates.add(template_path)
+
+        # The entries rendered by each template
+        template_entries: dict[Path, list[EntryURI]] = {}
+        for entry_uri in context["entries"]:
+            for template_path in self.get_entry_templates(entry_uri):
+                template_entries.setdefault(template_path, []).append(entry_uri)
 
         # Process edited entries
         for entry_uri in changed_entry_uris:
-            for tp in template_paths:
-                if self.template_can_render_entry(tp, context, entry_uri):
-                    render_queue.add(("entry", tp, entry_uri))
+            for tp in self.get_entry_templates(entry_uri):
+                render_queue.add(("entry", tp, entry_uri))
 
         # Process edited templates
         for template_path in changed_templates:
@@ -323,37 +769,46 @@ class JinjaRenderer(Renderer):
             ):
                 continue
 
-            can_render_an_entry = False
-            for entry_uri in context["entries"]:
-                if self.template_can_render_entry(template_path, context, entry_uri):
-                    render_queue.add(("entry", template_path, entry_uri))
-                    can_render_an_entry = True
+            for entry_uri in template_entries.get(template_path, []):
+                render_queue.add(("entry", template_path, entry_uri))
 
-            if not self.is_entry_template(template_path) and not can_render_an_entry:
+            if not self.is_entry_template(template_path) and template_path not in template_entries:
                 render_queue.add(("template", template_path, template_path.with_suffix("")))
 
         # Process everything else
         for template_path in template_paths:
-            can_render_an_entry = False
-            for entry_uri in context["entries"]:
-                if self.template_can_render_entry(template_path, context, entry_uri):
-                    can_render_an_entry = True
-                    if config.fast_rebuilds:
-                        files_to_keep.add(self.get_entry_output_path(template_path, entry_uri))
-                    else:
-                        render_queue.add(("entry", template_path, entry_uri))
-
-            if not self.is_entry_template(template_path) and not can_render_an_entry:
+            for entry_uri in template_entries.get(template_path, []):
+                if render_everything:
+                    render_queue.add(("entry", template_path, entry_uri))
+                elif is_in_shard(entry_uri):
+                    files_to_keep.add(self.get_entry_output_path(template_path, entry_uri))
+
+            if not self.is_entry_template(template_path) and template_path not in template_entries:
                 output_path = template_path.with_suffix("")  # Remove .jinja
-                if config.fast_rebuilds:
-                    files_to_keep.add(output_path)
-                else:
+                if render_everything:
                     render_queue.add(("template", template_path, output_path))
+                elif is_in_shard(str(template_path)):
+                    files_to_keep.add(output_path)
 
         for render_type, template_path, value in render_queue:
+            # Entries are split between shards by entry, and other pages by template
+            if not is_in_shard(value if render_type == "entry" else str(template_path)):
+                continue
+
             if render_type == "entry":
                 files_to_keep.update(self.render_entry(template_path, context, value))
             elif render_type == "template":
                 files_to_keep.update(self.render_template(template_path, context, value))
 
+        # Bundles written by {% alljs %} and {% allCss %}. Pages that were not rendered again still use them.
+        for extension in self.get_fragment_loader_extensions():
+            files_to_keep.update(extension.bundle_paths)
+
+        if config.fragment_bundle_path and not render_everything:
+            # The pages that were not rendered again might use bundles written by a previous run of Ursus. The bundles
+            # are only deleted when every page is rendered again.
+            files_to_keep.update(
+                path for path in get_output_sink().list_files() if path.is_relative_to(config.fragment_bundle_path)
+            )
+
         return files_to_keep
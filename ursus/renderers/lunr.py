@@ -3,6 +3,8 @@ from pathlib import Path
 from ursus.config import config
 from ursus.context_processors import Context, Entry, EntryURI
 from ursus.renderers import Renderer
+from ursus.sinks import get_output_sink
+from ursus.utils import is_in_shard
 import json
 import logging
 
@@ -38,29 +40,34 @@ class LunrIndexRenderer(Renderer):
 
             yield indexed_document, returned_document
 
-    def render(self, context: Context, changed_files: set[Path] | None = None) -> set[Path]:
-        if config.fast_rebuilds:
-            if (config.output_path / config.lunr_index_output_path).exists():
-                return {config.lunr_index_output_path}
-            return set()
-
-        index_output_path = config.output_path / config.lunr_index_output_path
+    def get_documents(self, context: Context) -> list[tuple[tuple[int, int], tuple[dict, dict], dict]]:
+        """
+        Returns:
+            list: The position, indexed_document and returned_document of each entry in the index. indexed_document
+                contains the fields that are included in the Lunr index. returned_document contains information about
+                the entry (title, URL). The position keeps the documents of different shards in the same order.
+        """
+        documents = []
+        for index_number, index_config in enumerate(config.lunr_indexes.get("indexes", [])):
+            for entry_number, (entry_uri, entry) in enumerate(context["entries"].items()):
+                if is_in_shard(entry_uri):
+                    for indexed_document, returned_document in self.get_index_for_entry(
+                        index_config, entry_uri, entry
+                    ):
+                        documents.append(((index_number, entry_number), indexed_document, returned_document))
+        return documents
+
+    def write_index(self, documents: list) -> None:
         logger.info(f"Generating search index at {config.lunr_index_output_path}")
 
         indexed_documents = []
         returned_documents = {}
 
-        document_ref = 0
-        for index_config in config.lunr_indexes.get("indexes", []):
-            for entry_uri, entry in context["entries"].items():
-                for indexed_document, returned_document in self.get_index_for_entry(index_config, entry_uri, entry):
-                    # indexed_document contains the fields that are included in the Lunr index
-                    # returned_document contains information about the entry (title, URL)
-                    # The ref attribute connects a Lunr search result to a returned_document
-                    indexed_document[0]["ref"] = document_ref
-                    indexed_documents.append(indexed_document)
-                    returned_documents[document_ref] = returned_document
-                    document_ref += 1
+        for document_ref, (_, indexed_document, returned_document) in enumerate(sorted(documents, key=lambda d: d[0])):
+            # The ref attribute connects a Lunr search result to a returned_document
+            indexed_document[0]["ref"] = document_ref
+            indexed_documents.append(indexed_document)
+            returned_documents[document_ref] = returned_document
 
         index = lunr(
             ref="ref",
@@ -68,14 +75,40 @@ class LunrIndexRenderer(Renderer):
             documents=indexed_documents,
         )
 
-        index_output_path.parent.mkdir(parents=True, exist_ok=True)
-        with index_output_path.open("w+") as index_file:
-            json.dump(
+        get_output_sink().write_text(
+            config.lunr_index_output_path,
+            json.dumps(
                 {
                     "index": index.serialize(),
                     "documents": returned_documents,
-                },
-                index_file,
+                }
+            ),
+        )
+
+    def render(self, context: Context, changed_files: set[Path] | None = None) -> set[Path]:
+        if config.fast_rebuilds:
+            if get_output_sink().exists(config.lunr_index_output_path):
+                return {config.lunr_index_output_path}
+            return set()
+
+        if config.shard:
+            # Each shard saves the documents of its entries. `ursus merge` builds the index with all documents.
+            get_output_sink().write_text(
+                config.lunr_index_output_path, json.dumps({"shard_documents": self.get_documents(context)})
             )
+        else:
+            self.write_index(self.get_documents(context))
+
+        return set([config.lunr_index_output_path])
+
+    def merge_shards(self, shard_output_paths: list[Path]) -> set[Path]:
+        documents = []
+        for shard_output_path in shard_output_paths:
+            shard_index_path = shard_output_path / config.lunr_index_output_path
+            if shard_index_path.exists():
+                with shard_index_path.open() as shard_index_file:
+                    for position, indexed_document, returned_document in json.load(shard_index_file)["shard_documents"]:
+                        documents.append((tuple(position), tuple(indexed_document), returned_document))
 
+        self.write_index(documents)
         return set([config.lunr_index_output_path])
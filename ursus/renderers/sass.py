@@ -1,35 +1,198 @@
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from ursus.cache import Cache, get_file_fingerprint, get_file_hash
 from ursus.config import config
 from ursus.context_processors import Context
 from ursus.renderers import Renderer
-from ursus.utils import get_files_in_path
+from ursus.sinks import get_output_sink
+from ursus.utils import get_files_in_path, get_fingerprinted_path, is_in_shard
+import hashlib
+import json
 import logging
+import multiprocessing
+import os
+import re
 import sass
 
 
 logger = logging.getLogger(__name__)
 
 
+# Matches @import, @use and @forward rules. The quoted strings in the rule are the imported files.
+SCSS_IMPORT_RE = re.compile(r"@(?:import|use|forward)\s+([^;]+);")
+SCSS_IMPORT_PATH_RE = re.compile(r"""["']([^"']+)["']""")
+
+
+def get_scss_imports(scss_code: str) -> list[str]:
+    """
+    Args:
+        scss_code (str): Sass code
+    Returns:
+        list: The files imported by this code, as they are written in @import, @use and @forward rules. Built-in
+            modules (sass:math), URLs and plain CSS imports are ignored.
+    """
+    imports = []
+    for import_rule in SCSS_IMPORT_RE.finditer(scss_code):
+        for import_path in SCSS_IMPORT_PATH_RE.findall(import_rule[1]):
+            if not import_path.startswith(("sass:", "http://", "https://", "//")) and not import_path.endswith(".css"):
+                imports.append(import_path)
+    return imports
+
+
+def resolve_scss_import(import_path: str, base_path: Path) -> Path | None:
+    """
+    Finds the file imported by a Sass @import, @use or @forward rule, like Sass does.
+
+    Args:
+        import_path (str): The imported path, for example "components/buttons"
+        base_path (Path): The directory of the file that imports it
+    Returns:
+        Path: The absolute path of the imported file, or None if it's not found
+    """
+    for root_path in (base_path, config.templates_path):
+        path = root_path / import_path
+        if path.suffix in (".scss", ".sass"):
+            candidates = [path, path.with_name("_" + path.name)]
+        else:
+            candidates = [
+                *[path.with_name(prefix + path.name + suffix) for prefix in ("", "_") for suffix in (".scss", ".sass")],
+                *[path / (prefix + "index" + suffix) for prefix in ("_", "") for suffix in (".scss", ".sass")],
+            ]
+        for candidate in candidates:
+            if candidate.is_file():
+                return candidate.resolve()
+    return None
+
+
+def compile_scss(filename: str, output_style: str, include_paths: list[str]) -> str:
+    # Runs in a separate process. libsass does not release the GIL, so threads would not compile in parallel.
+    return sass.compile(filename=filename, output_style=output_style, include_paths=include_paths)
+
+
 class SassRenderer(Renderer):
     """
     Renders Sass .scss files as .css
+
+    Each stylesheet is only compiled again if it changed, or if a file it imports changed. Compiled stylesheets are
+    cached in config.cache_path. Multiple stylesheets are compiled in parallel.
+
+    With config.fingerprint_assets, each stylesheet is also saved under a name that contains a hash of the compiled
+    CSS, and the fingerprinted name is added to context["asset_manifest"]. Sharded builds compile every stylesheet,
+    because the pages of each shard need their fingerprinted names.
     """
 
+    def __init__(self):
+        super().__init__()
+        self.compiled_css_cache = Cache("sass")
+
+        # The files directly imported by each .scss file, and the fingerprint of the .scss file
+        self.scss_imports: dict[Path, tuple[tuple[int, int], set[Path]]] = {}
+
+        # The fingerprinted path of each stylesheet, by output path
+        self.fingerprinted_paths: dict[Path, Path] = {}
+
+    def get_direct_dependencies(self, abs_scss_path: Path) -> set[Path]:
+        fingerprint = get_file_fingerprint(abs_scss_path)
+        if abs_scss_path not in self.scss_imports or self.scss_imports[abs_scss_path][0] != fingerprint:
+            dependencies = set()
+            for import_path in get_scss_imports(abs_scss_path.read_text()):
+                abs_import_path = resolve_scss_import(import_path, abs_scss_path.parent)
+                if abs_import_path:
+                    dependencies.add(abs_import_path)
+            self.scss_imports[abs_scss_path] = (fingerprint, dependencies)
+        return self.scss_imports[abs_scss_path][1]
+
+    def get_dependencies(self, abs_scss_path: Path) -> set[Path]:
+        """
+        Returns:
+            set: The absolute paths of this file, and of all the files it imports, directly or indirectly
+        """
+        dependencies = set()
+        paths_to_visit = [abs_scss_path]
+        while paths_to_visit:
+            path = paths_to_visit.pop()
+            if path not in dependencies and path.is_file():
+                dependencies.add(path)
+                paths_to_visit.extend(self.get_direct_dependencies(path))
+        return dependencies
+
+    def get_compile_args(self, abs_scss_path: Path) -> tuple[str, str, list[str]]:
+        return (
+            str(abs_scss_path),
+            "compressed" if config.minify_css else "nested",
+            [str(config.templates_path)],
+        )
+
+    def get_cache_key(self, abs_scss_path: Path, dependencies: set[Path]) -> str:
+        return hashlib.sha256(
+            json.dumps(
+                {
+                    "compile_args": self.get_compile_args(abs_scss_path),
+                    "dependencies": sorted((str(path), get_file_hash(path)) for path in dependencies),
+                }
+            ).encode()
+        ).hexdigest()
+
+    def compile_all(self, abs_scss_paths: list[Path]) -> list[str]:
+        compile_args = [self.get_compile_args(path) for path in abs_scss_paths]
+        workers = min(len(compile_args), os.cpu_count() or 1)
+        if workers < 2:
+            return [compile_scss(*args) for args in compile_args]
+
+        # Spawn new processes instead of forking, because the file watcher runs in a thread
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            return list(executor.map(compile_scss, *zip(*compile_args)))
+
     def render(self, context: Context, changed_files: set[Path] | None = None) -> set[Path]:
         files_to_keep = set()
+        output_paths = []
+        stylesheets_to_compile: dict[Path, tuple[Path, str]] = {}  # Output path: (.scss path, cache key)
+
         for scss_path in get_files_in_path(config.templates_path, suffix=".scss"):
             output_path = scss_path.with_suffix(".css")
+            if not is_in_shard(str(output_path)) and not config.fingerprint_assets:
+                continue
+            output_paths.append(output_path)
+
+            abs_scss_path = config.templates_path / scss_path
+            dependencies = self.get_dependencies(abs_scss_path)
+
+            if (
+                changed_files is None
+                or not dependencies.isdisjoint(changed_files)
+                or (config.fingerprint_assets and output_path not in self.fingerprinted_paths)
+            ):
+                cache_key = self.get_cache_key(abs_scss_path, dependencies)
+                compiled_css = self.compiled_css_cache.get(cache_key)
+                if compiled_css is None:
+                    stylesheets_to_compile[output_path] = (abs_scss_path, cache_key)
+                else:
+                    logger.info("Rendering %s from cache", str(output_path))
+                    self.write_css(output_path, compiled_css)
 
-            if changed_files is None or (config.templates_path / scss_path) in changed_files:
-                logger.info("Rendering %s", str(output_path))
-                with (config.output_path / output_path).open("w") as css_file:
-                    css_file.write(
-                        sass.compile(
-                            filename=str(config.templates_path / scss_path),
-                            output_style="compressed" if config.minify_css else "nested",
-                            include_paths=[str(config.templates_path)],
-                        )
-                    )
-            files_to_keep.add(output_path)
+        compiled_stylesheets = self.compile_all([abs_scss_path for abs_scss_path, _ in stylesheets_to_compile.values()])
+        for (output_path, (_, cache_key)), compiled_css in zip(stylesheets_to_compile.items(), compiled_stylesheets):
+            logger.info("Rendering %s", str(output_path))
+            self.compiled_css_cache.set(cache_key, compiled_css)
+            self.write_css(output_path, compiled_css)
+
+        for output_path in output_paths:
+            if config.fingerprint_assets:
+                context["asset_manifest"][str(output_path)] = str(self.fingerprinted_paths[output_path])
+            if is_in_shard(str(output_path)):
+                files_to_keep.add(output_path)
+                if config.fingerprint_assets:
+                    files_to_keep.add(self.fingerprinted_paths[output_path])
 
         return files_to_keep
+
+    def write_css(self, output_path: Path, compiled_css: str) -> None:
+        if config.fingerprint_assets:
+            css_hash = hashlib.sha256(compiled_css.encode()).hexdigest()
+            self.fingerprinted_paths[output_path] = get_fingerprinted_path(output_path, css_hash)
+
+        if is_in_shard(str(output_path)):
+            output_sink = get_output_sink()
+            output_sink.write_text(output_path, compiled_css)
+            if config.fingerprint_assets:
+                output_sink.duplicate(output_path, self.fingerprinted_paths[output_path])
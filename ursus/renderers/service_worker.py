@@ -0,0 +1,121 @@
+from pathlib import Path, PurePosixPath
+from ursus.config import config
+from ursus.context_processors import Context
+from ursus.renderers import Renderer
+from ursus.sinks import get_output_sink
+import hashlib
+import json
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+# Downloads the files in PRECACHE_MANIFEST when the service worker is installed, and serves them from the cache. A new
+# service worker with a new cache is installed when the manifest changes.
+service_worker_code = """
+self.addEventListener("install", (event) => {
+    const requests = PRECACHE_MANIFEST.map((file) => new Request(file.url, { cache: "reload" }));
+    event.waitUntil(caches.open(CACHE_NAME).then((cache) => cache.addAll(requests)));
+    self.skipWaiting();
+});
+
+self.addEventListener("activate", (event) => {
+    event.waitUntil(
+        caches.keys()
+            .then((keys) => Promise.all(
+                keys.filter((key) => key.startsWith(CACHE_PREFIX) && key !== CACHE_NAME).map((key) => caches.delete(key))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener("fetch", (event) => {
+    if (event.request.method !== "GET") {
+        return;
+    }
+    event.respondWith(
+        caches.open(CACHE_NAME)
+            .then((cache) => cache.match(event.request, { ignoreSearch: true }))
+            .then((response) => response || fetch(event.request))
+    );
+});
+"""
+
+
+class ServiceWorkerRenderer(Renderer):
+    """
+    Renders a precache manifest and a service worker. The service worker downloads the output files that match
+    config.precache_patterns in advance, so that they are available offline.
+
+    The manifest lists the URL and the content hash (revision) of each file. The manifest and the service worker are
+    only written again when a revision changes, so that browsers only download the files again when they change.
+
+    This renderer must run after the others, because it lists their output files (context["output_files"]).
+    """
+
+    cache_prefix = "ursus-precache-"
+
+    def get_url(self, output_path: Path) -> str:
+        if output_path.suffix == ".html":
+            output_path = output_path.with_suffix(config.html_url_extension)
+        return f"{config.site_url}/{str(output_path)}"
+
+    def should_precache(self, output_path: Path) -> bool:
+        # Path.match() matches relative patterns from the right, so "index.html" would also match "blog/index.html".
+        # Absolute patterns must match the whole path.
+        anchored_path = PurePosixPath("/", output_path)
+        return any(anchored_path.match(f"/{pattern}") for pattern in config.precache_patterns)
+
+    def get_precache_manifest(self, output_files: set[Path]) -> list[dict]:
+        """
+        Returns:
+            list: The URL and content hash of each output file that matches config.precache_patterns, sorted by URL.
+                Files that are not written yet (for example lazily rendered images) are skipped.
+        """
+        output_sink = get_output_sink()
+        service_worker_files = (config.precache_manifest_output_path, config.service_worker_output_path)
+        manifest = []
+        for path in output_files:
+            if path not in service_worker_files and self.should_precache(path):
+                revision = output_sink.get_file_hash(path)
+                if revision is not None:
+                    manifest.append({"url": self.get_url(path), "revision": revision})
+        return sorted(manifest, key=lambda file: file["url"])
+
+    def write_if_changed(self, output_path: Path, content: str) -> None:
+        output_sink = get_output_sink()
+        if output_sink.get_file_hash(output_path) != hashlib.sha256(content.encode()).hexdigest():
+            logger.info("Rendering %s", str(output_path))
+            output_sink.write_text(output_path, content)
+
+    def write_service_worker(self, output_files: set[Path]) -> set[Path]:
+        if not config.precache_patterns:
+            return set()
+
+        manifest_json = json.dumps(self.get_precache_manifest(output_files), indent=2)
+        cache_name = self.cache_prefix + hashlib.sha256(manifest_json.encode()).hexdigest()[:16]
+
+        self.write_if_changed(config.precache_manifest_output_path, manifest_json)
+        self.write_if_changed(
+            config.service_worker_output_path,
+            f"const CACHE_PREFIX = {json.dumps(self.cache_prefix)};\n"
+            f"const CACHE_NAME = {json.dumps(cache_name)};\n"
+            f"const PRECACHE_MANIFEST = {manifest_json};\n"
+            f"{service_worker_code}",
+        )
+        return {config.precache_manifest_output_path, config.service_worker_output_path}
+
+    def render(self, context: Context, changed_files: set[Path] | None = None) -> set[Path]:
+        if config.shard:
+            # The service worker lists the files of every shard. It's rendered by `ursus merge`.
+            return set()
+        return self.write_service_worker(context["output_files"])
+
+    def merge_shards(self, shard_output_paths: list[Path]) -> set[Path]:
+        output_files = set()
+        for shard_output_path in shard_output_paths:
+            output_files.update(
+                path.relative_to(shard_output_path) for path in shard_output_path.rglob("*") if path.is_file()
+            )
+        return self.write_service_worker(output_files)
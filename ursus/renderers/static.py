@@ -1,8 +1,11 @@
 from pathlib import Path
+from ursus.cache import get_file_hash
 from ursus.config import config
 from ursus.context_processors import Context
 from ursus.renderers import Renderer
-from ursus.utils import get_files_in_path, copy_file
+from ursus.sinks import get_output_sink
+from ursus.sources import get_content_source
+from ursus.utils import get_files_in_path, get_fingerprinted_path, is_in_shard
 import logging
 
 
@@ -11,39 +14,80 @@ logger = logging.getLogger(__name__)
 
 class StaticFileRenderer(Renderer):
     """
-    Copies static files to `output_path`
+    Mirrors static files to `output_path`. Files that are already in the output are not copied again. Files are
+    cloned or hard linked instead of copied when possible (see config.hard_link_static_files).
+
+    The copied files are remembered, so that rebuilds only look at the files that changed.
     """
 
+    def __init__(self):
+        super().__init__()
+        # The absolute original path of each output file, including files in other shards. None until all files are
+        # listed.
+        self.copied_files: dict[Path, Path] | None = None
+
     def get_files_to_copy(self, changed_files: set[Path] | None = None) -> list[tuple[Path, Path]]:
         # Return list of tuples: (absolute_original_path, destination_relative_to_output_path)
+        # If changed_files is set, only return the changed files that still exist
         return []
 
     def render(self, context: Context, changed_files: set[Path] | None = None) -> set[Path]:
-        files_to_keep = set()
-        for asset_path, rel_output_path in self.get_files_to_copy():
-            abs_output_path = config.output_path / rel_output_path
-
-            if changed_files is None or asset_path in changed_files:
+        if changed_files is not None and any(file.is_dir() for file in changed_files):
+            # A directory was added or moved here. The files it contains are unknown.
+            changed_files = None
+
+        if changed_files is None or self.copied_files is None:
+            files_to_copy = self.get_files_to_copy()
+            self.copied_files = {}
+        else:
+            # The other files did not change since the last build. There is no need to list them again. A moved or
+            # deleted directory is a single change, so the files under a changed path are forgotten too.
+            files_to_copy = self.get_files_to_copy(changed_files) if changed_files else []
+            self.copied_files = {
+                rel_output_path: asset_path
+                for rel_output_path, asset_path in self.copied_files.items()
+                if not any(asset_path.is_relative_to(file) for file in changed_files)
+            }
+
+        for asset_path, rel_output_path in files_to_copy:
+            if is_in_shard(str(rel_output_path)) and (changed_files is None or asset_path in changed_files):
                 logger.info("Copying asset %s", str(rel_output_path))
-                copy_file(asset_path, abs_output_path)
-            files_to_keep.add(rel_output_path)
+                self.copy_file(asset_path, rel_output_path)
+            self.copied_files[rel_output_path] = asset_path
 
-        return files_to_keep
+        return {rel_output_path for rel_output_path in self.copied_files if is_in_shard(str(rel_output_path))}
+
+    def copy_file(self, asset_path: Path, rel_output_path: Path) -> None:
+        get_output_sink().mirror_file(asset_path, rel_output_path)
 
 
 class StaticAssetRenderer(StaticFileRenderer):
     """
     Copies static assets in `templates_path` to `output_path`
+
+    With config.fingerprint_assets, each asset is also copied under a name that contains a hash of its content, and
+    the fingerprinted name is added to context["asset_manifest"].
     """
 
     ignored_suffixes = (".jinja",)
 
     def get_files_to_copy(self, changed_files: set[Path] | None = None) -> list[tuple[Path, Path]]:
-        return [
-            (config.templates_path / f, f)
-            for f in get_files_in_path(config.templates_path)
-            if f.suffix.lower() not in self.ignored_suffixes
-        ]
+        files_to_copy = []
+        for f in get_files_in_path(config.templates_path, whitelist=changed_files):
+            if f.suffix.lower() not in self.ignored_suffixes:
+                files_to_copy.append((config.templates_path / f, f))
+                if config.fingerprint_assets:
+                    fingerprinted_path = get_fingerprinted_path(f, get_file_hash(config.templates_path / f))
+                    files_to_copy.append((config.templates_path / f, fingerprinted_path))
+        return files_to_copy
+
+    def render(self, context: Context, changed_files: set[Path] | None = None) -> set[Path]:
+        files_to_keep = super().render(context, changed_files)
+        for rel_output_path, asset_path in (self.copied_files or {}).items():
+            asset_uri = str(asset_path.relative_to(config.templates_path))
+            if asset_uri != str(rel_output_path):
+                context["asset_manifest"][asset_uri] = str(rel_output_path)
+        return files_to_keep
 
 
 class ArchiveRenderer(StaticFileRenderer):
@@ -56,6 +100,9 @@ class ArchiveRenderer(StaticFileRenderer):
     def get_files_to_copy(self, changed_files: set[Path] | None = None) -> list[tuple[Path, Path]]:
         return [
             (config.content_path / f, f)
-            for f in get_files_in_path(config.content_path)
+            for f in get_content_source().get_files(whitelist=changed_files)
             if f.suffix.lower() in self.included_suffixes
         ]
+
+    def copy_file(self, asset_path: Path, rel_output_path: Path) -> None:
+        get_content_source().copy_to_output(asset_path, rel_output_path)
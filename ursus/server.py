@@ -1,6 +1,9 @@
 from http.server import SimpleHTTPRequestHandler
+from pathlib import Path
 from threading import Thread
+from urllib.parse import unquote, urlparse
 from ursus.config import config
+from ursus.renderers.image import image_transform_queue
 import logging
 import socketserver
 
@@ -14,6 +17,10 @@ class HttpRequestHandler(SimpleHTTPRequestHandler):
         abs_html_path = abs_path.with_suffix(".html")
         abs_index_path = abs_path / "index.html"
 
+        if not abs_path.exists():
+            # Images that are not rendered yet are rendered when they are requested
+            image_transform_queue.render(Path(unquote(urlparse(self.path).path).removeprefix("/")))
+
         if not abs_path.exists():
             if abs_path.suffix == config.html_url_extension and abs_html_path.exists():
                 self.path = str(abs_html_path.relative_to(config.output_path))
@@ -0,0 +1,106 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator
+import io
+
+
+class OutputSink:
+    """
+    Receives the files rendered by Ursus. Renderers write through the output sink instead of writing to
+    config.output_path, so that the website can be written somewhere else than the local file system.
+
+    All paths are relative to the root of the website.
+    """
+
+    # If False, every build renders the whole website, because the files of the previous build are not kept
+    supports_partial_builds: bool = True
+
+    @contextmanager
+    def open(self, path: Path) -> Iterator[BinaryIO]:
+        """Opens an output file for writing. The file is replaced when the context manager exits.
+
+        Args:
+            path (Path): The path of the output file
+        """
+        buffer = io.BytesIO()
+        yield buffer
+        self.write_bytes(path, buffer.getvalue())
+
+    def write_bytes(self, path: Path, content: bytes) -> None:
+        raise NotImplementedError
+
+    def write_text(self, path: Path, content: str) -> None:
+        self.write_bytes(path, content.encode())
+
+    def copy_file(self, abs_source_path: Path, path: Path) -> None:
+        """Copies a file to the output
+
+        Args:
+            abs_source_path (Path): The absolute path of the file to copy
+            path (Path): The path of the output file
+        """
+        self.write_bytes(path, abs_source_path.read_bytes())
+
+    def link_file(self, abs_source_path: Path, path: Path) -> None:
+        """Like copy_file(), but the output file can be a link to the source file. The source file must not be
+        modified afterwards.
+        """
+        self.copy_file(abs_source_path, path)
+
+    def mirror_file(self, abs_source_path: Path, path: Path) -> None:
+        """Like copy_file(), but the file is not copied again if the output file is already a copy of it. The output
+        file can be a link to the source file.
+        """
+        self.copy_file(abs_source_path, path)
+
+    def duplicate(self, existing_path: Path, path: Path) -> None:
+        """Copies an output file to another output path
+
+        Args:
+            existing_path (Path): The path of an output file that was already written
+            path (Path): The path of the copy
+        """
+        raise NotImplementedError
+
+    def exists(self, path: Path) -> bool:
+        raise NotImplementedError
+
+    def delete(self, path: Path) -> None:
+        """Deletes an output file, if it exists"""
+        raise NotImplementedError
+
+    def list_files(self) -> Iterator[Path]:
+        """
+        Returns:
+            Iterator: The path of every output file
+        """
+        raise NotImplementedError
+
+    def get_fingerprint(self, path: Path) -> Any:
+        """
+        Returns:
+            A value that changes when the output file is modified, or None if it's unknown
+        """
+        return None
+
+    def get_file_hash(self, path: Path) -> str | None:
+        """
+        Returns:
+            str: The SHA-256 hash of the output file, or None if it does not exist or can't be read
+        """
+        return None
+
+    def close(self) -> None:
+        """Called at the end of every build"""
+        pass
+
+
+def get_output_sink() -> OutputSink:
+    """
+    Returns:
+        OutputSink: config.output_sink, or a FileSystemSink that writes to config.output_path
+    """
+    from ursus.config import config
+    from ursus.sinks.filesystem import FileSystemSink
+
+    return config.output_sink or FileSystemSink()
@@ -0,0 +1,119 @@
+from pathlib import Path
+from typing import Any, Callable, Iterator
+from ursus.cache import get_file_hash
+from ursus.sinks import OutputSink
+import hashlib
+import io
+import logging
+import tarfile
+import threading
+import time
+import zipfile
+
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveSink(OutputSink):
+    """
+    Writes the website to a .tar, .tar.gz, .tar.bz2, .tar.xz or .zip archive, for example to deploy it as a single
+    file. Files are added to the archive as they are rendered, without writing them to the disk first.
+
+    The archive is written again on every build, so every build renders the whole website.
+
+    Example:
+        config.output_sink = ArchiveSink(Path("website.tar.gz"))
+    """
+
+    supports_partial_builds = False
+
+    def __init__(self, archive_path: Path):
+        """
+        Args:
+            archive_path (Path): The path of the archive. The archive type depends on the suffix.
+        """
+        self.archive_path = archive_path
+        self.archive: tarfile.TarFile | zipfile.ZipFile | None = None
+        # The SHA-256 hash of each file in the archive, by path
+        self.written_files: dict[Path, str] = {}
+
+        # Images can be rendered by a background thread
+        self.lock = threading.RLock()
+
+    def is_zip(self) -> bool:
+        return self.archive_path.suffix.lower() == ".zip"
+
+    def get_archive(self) -> tarfile.TarFile | zipfile.ZipFile:
+        # The archive is opened by the first write of each build, and closed at the end of the build
+        if self.archive is None:
+            self.archive_path.parent.mkdir(parents=True, exist_ok=True)
+            if self.is_zip():
+                self.archive = zipfile.ZipFile(self.archive_path, "w", compression=zipfile.ZIP_DEFLATED)
+            else:
+                compression = self.archive_path.suffix.lower().removeprefix(".")
+                mode = f"w:{compression}" if compression in ("gz", "bz2", "xz") else "w"
+                self.archive = tarfile.open(self.archive_path, mode)
+        return self.archive
+
+    def add_file(self, path: Path, add: Callable[[Any], None], file_hash: str) -> None:
+        with self.lock:
+            if path in self.written_files:
+                raise ValueError(f"{str(path)} is already in {str(self.archive_path)}. Archives can't be overwritten.")
+            add(self.get_archive())
+            self.written_files[path] = file_hash
+
+    def write_bytes(self, path: Path, content: bytes) -> None:
+        def add(archive):
+            if isinstance(archive, zipfile.ZipFile):
+                archive.writestr(str(path), content)
+            else:
+                file_info = tarfile.TarInfo(str(path))
+                file_info.size = len(content)
+                file_info.mtime = int(time.time())
+                archive.addfile(file_info, io.BytesIO(content))
+
+        self.add_file(Path(path), add, hashlib.sha256(content).hexdigest())
+
+    def copy_file(self, abs_source_path: Path, path: Path) -> None:
+        def add(archive):
+            if isinstance(archive, zipfile.ZipFile):
+                archive.write(abs_source_path, str(path))
+            else:
+                archive.add(abs_source_path, str(path), recursive=False)
+
+        self.add_file(Path(path), add, get_file_hash(abs_source_path))
+
+    def duplicate(self, existing_path: Path, path: Path) -> None:
+        def add(archive):
+            if isinstance(archive, zipfile.ZipFile):
+                archive.writestr(str(path), archive.read(str(existing_path)))
+            else:
+                link_info = tarfile.TarInfo(str(path))
+                link_info.type = tarfile.LNKTYPE
+                link_info.linkname = str(existing_path)
+                link_info.mtime = int(time.time())
+                archive.addfile(link_info)
+
+        self.add_file(Path(path), add, self.written_files[Path(existing_path)])
+
+    def exists(self, path: Path) -> bool:
+        return Path(path) in self.written_files
+
+    def delete(self, path: Path) -> None:
+        if Path(path) in self.written_files:
+            logger.warning("Can't delete %s from %s", str(path), str(self.archive_path))
+
+    def list_files(self) -> Iterator[Path]:
+        yield from list(self.written_files)
+
+    def get_file_hash(self, path: Path) -> str | None:
+        return self.written_files.get(Path(path))
+
+    def close(self) -> None:
+        with self.lock:
+            if self.archive is not None:
+                self.archive.close()
+                self.archive = None
+                # The next build writes a new archive
+                self.written_files.clear()
+                logger.info("Saved the website to %s", str(self.archive_path))
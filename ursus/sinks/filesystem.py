@@ -0,0 +1,67 @@
+from pathlib import Path
+from typing import BinaryIO, Iterator
+from ursus.cache import get_file_fingerprint, get_file_hash
+from ursus.config import config
+from ursus.sinks import OutputSink
+from ursus.utils import copy_file, link_or_copy_file, mirror_file
+
+
+class FileSystemSink(OutputSink):
+    """
+    Writes the website to a directory. This is the default output sink.
+    """
+
+    def __init__(self, root_path: Path | None = None):
+        """
+        Args:
+            root_path (Path, optional): The output directory. If None, config.output_path is used.
+        """
+        self.root_path = root_path
+
+    def get_abs_path(self, path: Path) -> Path:
+        # config.output_path is read at every call, because it changes for sharded builds
+        return (self.root_path or config.output_path) / path
+
+    def open(self, path: Path) -> BinaryIO:
+        abs_path = self.get_abs_path(path)
+        abs_path.parent.mkdir(parents=True, exist_ok=True)
+        # The output file might be linked to other files. Replace it instead of overwriting it.
+        abs_path.unlink(missing_ok=True)
+        return abs_path.open("wb")
+
+    def write_bytes(self, path: Path, content: bytes) -> None:
+        with self.open(path) as file:
+            file.write(content)
+
+    def copy_file(self, abs_source_path: Path, path: Path) -> None:
+        self.delete(path)
+        copy_file(abs_source_path, self.get_abs_path(path))
+
+    def link_file(self, abs_source_path: Path, path: Path) -> None:
+        link_or_copy_file(abs_source_path, self.get_abs_path(path))
+
+    def mirror_file(self, abs_source_path: Path, path: Path) -> None:
+        mirror_file(abs_source_path, self.get_abs_path(path), hard_link=config.hard_link_static_files)
+
+    def duplicate(self, existing_path: Path, path: Path) -> None:
+        link_or_copy_file(self.get_abs_path(existing_path), self.get_abs_path(path))
+
+    def exists(self, path: Path) -> bool:
+        return self.get_abs_path(path).exists()
+
+    def delete(self, path: Path) -> None:
+        self.get_abs_path(path).unlink(missing_ok=True)
+
+    def list_files(self) -> Iterator[Path]:
+        root_path = self.root_path or config.output_path
+        for abs_path in root_path.rglob("*"):
+            if abs_path.is_file():
+                yield abs_path.relative_to(root_path)
+
+    def get_fingerprint(self, path: Path) -> tuple[int, int] | None:
+        abs_path = self.get_abs_path(path)
+        return get_file_fingerprint(abs_path) if abs_path.exists() else None
+
+    def get_file_hash(self, path: Path) -> str | None:
+        abs_path = self.get_abs_path(path)
+        return get_file_hash(abs_path) if abs_path.exists() else None
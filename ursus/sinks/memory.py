@@ -0,0 +1,42 @@
+from pathlib import Path
+from typing import Iterator
+from ursus.sinks import OutputSink
+import hashlib
+
+
+class MemorySink(OutputSink):
+    """
+    Keeps the website in memory, in `files`. Useful for tests and benchmarks, because nothing is written to disk.
+
+    Example:
+        config.output_sink = MemorySink()
+        build()
+        config.output_sink.files[Path("index.html")]
+    """
+
+    def __init__(self):
+        # The content of each output file, by path
+        self.files: dict[Path, bytes] = {}
+
+    def write_bytes(self, path: Path, content: bytes) -> None:
+        self.files[Path(path)] = content
+
+    def duplicate(self, existing_path: Path, path: Path) -> None:
+        self.files[Path(path)] = self.files[Path(existing_path)]
+
+    def exists(self, path: Path) -> bool:
+        return Path(path) in self.files
+
+    def delete(self, path: Path) -> None:
+        self.files.pop(Path(path), None)
+
+    def list_files(self) -> Iterator[Path]:
+        yield from list(self.files.keys())
+
+    def get_fingerprint(self, path: Path) -> int | None:
+        content = self.files.get(Path(path))
+        return None if content is None else id(content)
+
+    def get_file_hash(self, path: Path) -> str | None:
+        content = self.files.get(Path(path))
+        return None if content is None else hashlib.sha256(content).hexdigest()
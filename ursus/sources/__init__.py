@@ -0,0 +1,90 @@
+from pathlib import Path
+from typing import Any, BinaryIO
+import hashlib
+import io
+
+
+class ContentSource:
+    """
+    Provides the content files. Context processors, renderers and linters read the content through the content source
+    instead of reading config.content_path, so that the content does not have to be on the local file system.
+
+    Content files are still identified by their absolute path in config.content_path, like in `changed_files`, even if
+    they are not on the disk.
+    """
+
+    def get_files(self, whitelist: set[Path] | None = None, suffix: str | None = None) -> list[Path]:
+        """
+        Returns a list of valid, visible content files, like get_files_in_path(config.content_path).
+
+        Args:
+            whitelist (set, optional): Only include files that are part of this whitelist
+            suffix (str, optional): Only include files with this suffix
+        Returns:
+            list[Path]: The content files, relative to config.content_path
+        """
+        raise NotImplementedError
+
+    def exists(self, path: Path) -> bool:
+        """
+        Returns:
+            bool: Whether this file or directory exists
+        """
+        raise NotImplementedError
+
+    def is_file(self, path: Path) -> bool:
+        raise NotImplementedError
+
+    def read_bytes(self, path: Path) -> bytes:
+        raise NotImplementedError
+
+    def read_text(self, path: Path) -> str:
+        return self.read_bytes(path).decode()
+
+    def open(self, path: Path) -> BinaryIO:
+        return io.BytesIO(self.read_bytes(path))
+
+    def get_local_path(self, path: Path) -> Path | None:
+        """
+        Returns:
+            Path: The path of the file on the local file system, or None if it's not on the local file system. Some
+                tools are faster with a local file.
+        """
+        return None
+
+    def get_fingerprint(self, path: Path) -> Any:
+        """
+        Returns:
+            A cheap value that changes when the file changes
+        """
+        raise NotImplementedError
+
+    def get_file_hash(self, path: Path) -> str:
+        """
+        Returns:
+            str: The SHA-256 hash of the file's content
+        """
+        return hashlib.sha256(self.read_bytes(path)).hexdigest()
+
+    def copy_to_output(self, path: Path, output_path: Path) -> None:
+        """
+        Copies a content file to the output sink
+
+        Args:
+            path (Path): The absolute path of the content file
+            output_path (Path): The path of the output file, relative to the output
+        """
+        from ursus.sinks import get_output_sink
+
+        get_output_sink().write_bytes(output_path, self.read_bytes(path))
+
+
+def get_content_source() -> ContentSource:
+    """
+    Returns:
+        ContentSource: config.content_source, or a FileSystemSource that reads config.content_path
+    """
+    from ursus.config import config
+    from ursus.sources.filesystem import FileSystemSource
+
+    return config.content_source or FileSystemSource()
@@ -0,0 +1,43 @@
+from pathlib import Path
+from typing import BinaryIO
+from ursus.cache import get_file_fingerprint, get_file_hash
+from ursus.config import config
+from ursus.sinks import get_output_sink
+from ursus.sources import ContentSource
+from ursus.utils import get_files_in_path
+
+
+class FileSystemSource(ContentSource):
+    """
+    Reads the content in config.content_path. This is the default content source.
+    """
+
+    def get_files(self, whitelist: set[Path] | None = None, suffix: str | None = None) -> list[Path]:
+        return get_files_in_path(config.content_path, whitelist, suffix)
+
+    def exists(self, path: Path) -> bool:
+        return path.exists()
+
+    def is_file(self, path: Path) -> bool:
+        return path.is_file()
+
+    def read_bytes(self, path: Path) -> bytes:
+        return path.read_bytes()
+
+    def read_text(self, path: Path) -> str:
+        return path.read_text()
+
+    def open(self, path: Path) -> BinaryIO:
+        return path.open("rb")
+
+    def get_local_path(self, path: Path) -> Path | None:
+        return path
+
+    def get_fingerprint(self, path: Path) -> tuple[int, int]:
+        return get_file_fingerprint(path)
+
+    def get_file_hash(self, path: Path) -> str:
+        return get_file_hash(path)
+
+    def copy_to_output(self, path: Path, output_path: Path) -> None:
+        get_output_sink().mirror_file(path, output_path)
@@ -0,0 +1,80 @@
+from pathlib import Path
+from ursus.config import config
+from ursus.sources import ContentSource
+from ursus.utils import is_ignored_file
+import hashlib
+
+
+class MemorySource(ContentSource):
+    """
+    Content kept in memory, in `files`. Useful for tests and benchmarks, because nothing is read from the disk.
+
+    Example:
+        config.content_source = MemorySource({
+            "posts/hello.md": "---\\ntitle: Hello\\n---\\nHello world!",
+            "images/photo.jpg": photo_bytes,
+        })
+    """
+
+    def __init__(self, files: dict[str | Path, str | bytes] | None = None):
+        """
+        Args:
+            files (dict, optional): The content of each file, by path relative to config.content_path
+        """
+        # The content of each file, by path relative to config.content_path
+        self.files: dict[Path, bytes] = {}
+        self.file_hashes: dict[Path, str] = {}
+        for path, content in (files or {}).items():
+            self.set_file(path, content)
+
+    def set_file(self, path: str | Path, content: str | bytes) -> None:
+        content = content.encode() if isinstance(content, str) else content
+        self.files[Path(path)] = content
+        self.file_hashes[Path(path)] = hashlib.sha256(content).hexdigest()
+
+    def delete_file(self, path: str | Path) -> None:
+        self.files.pop(Path(path), None)
+        self.file_hashes.pop(Path(path), None)
+
+    def get_relative_path(self, path: Path) -> Path | None:
+        if not path.is_absolute():
+            return path
+        elif path.is_relative_to(config.content_path):
+            return path.relative_to(config.content_path)
+        return None
+
+    def get_files(self, whitelist: set[Path] | None = None, suffix: str | None = None) -> list[Path]:
+        if whitelist:
+            paths = {self.get_relative_path(path) for path in whitelist} & self.files.keys()
+        else:
+            paths = self.files.keys()
+
+        return [
+            path
+            for path in paths
+            if not is_ignored_file(config.content_path / path, config.content_path) and suffix in (None, path.suffix)
+        ]
+
+    def exists(self, path: Path) -> bool:
+        relative_path = self.get_relative_path(path)
+        return relative_path is not None and (
+            relative_path in self.files or any(relative_path in file.parents for file in self.files)
+        )
+
+    def is_file(self, path: Path) -> bool:
+        return self.get_relative_path(path) in self.files
+
+    def read_bytes(self, path: Path) -> bytes:
+        relative_path = self.get_relative_path(path)
+        if relative_path not in self.files:
+            raise FileNotFoundError(path)
+        return self.files[relative_path]
+
+    def get_fingerprint(self, path: Path) -> str:
+        return self.get_file_hash(path)
+
+    def get_file_hash(self, path: Path) -> str:
+        relative_path = self.get_relative_path(path)
+        if relative_path not in self.file_hashes:
+            raise FileNotFoundError(path)
+        return self.file_hashes[relative_path]
@@ -0,0 +1,31 @@
+from ursus.cache import Cache
+from ursus.config import config
+
+
+def test_persistent_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "cache_path", tmp_path)
+    Cache("test").set("key", {"width": 100, "height": 50})
+    assert Cache("test").get("key") == {"width": 100, "height": 50}
+
+
+def test_cache_names_do_not_conflict(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "cache_path", tmp_path)
+    Cache("first").set("key", 1)
+    Cache("second").set("key", 2)
+    assert Cache("first").get("key") == 1
+    assert Cache("second").get("key") == 2
+
+
+def test_missing_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "cache_path", tmp_path)
+    assert Cache("test").get("missing") is None
+    assert Cache("test").get("missing", "default") == "default"
+
+
+def test_in_memory_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "cache_path", tmp_path)
+    monkeypatch.setattr(config, "persistent_cache", False)
+    cache = Cache("test")
+    cache.set("key", 1)
+    assert cache.get("key") == 1
+    assert Cache("test").get("key") is None
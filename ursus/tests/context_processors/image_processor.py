@@ -0,0 +1,36 @@
+from PIL import Image
+from ursus import utils
+from ursus.config import config
+from ursus.context_processors.image import ImageProcessor
+from ursus.sources import get_content_source
+
+
+def test_image_metadata_does_not_open_local_images(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "content_path", tmp_path)
+    monkeypatch.setattr(config, "content_source", None)
+    Image.new("RGB", (30, 20)).save(tmp_path / "photo.jpg")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The image should be read with imagesize")
+
+    monkeypatch.setattr(utils.Image, "open", fail)
+    assert utils.get_image_metadata(tmp_path / "photo.jpg") == {"width": 30, "height": 20, "format": "JPEG"}
+
+
+def test_outdated_metadata_is_not_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "content_path", tmp_path)
+    monkeypatch.setattr(config, "content_source", None)
+    monkeypatch.setattr(config, "persistent_cache", False)
+    Image.new("RGB", (30, 20)).save(tmp_path / "photo.jpg")
+    processor = ImageProcessor()
+
+    # Metadata cached by an older version of Ursus, with the same file and transforms
+    old_fingerprint = (get_content_source().get_fingerprint(tmp_path / "photo.jpg"), repr(config.image_transforms))
+    processor.metadata_cache.set(
+        str(tmp_path / "photo.jpg"), {"fingerprint": old_fingerprint, "width": 1, "height": 1, "transforms": []}
+    )
+
+    metadata = processor.get_metadata(tmp_path / "photo.jpg", "photo.jpg")
+    assert (metadata["width"], metadata["height"]) == (30, 20)
+    assert metadata["transforms"]
+    assert processor.get_metadata(tmp_path / "photo.jpg", "photo.jpg") == metadata
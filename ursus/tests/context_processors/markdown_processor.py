@@ -0,0 +1,61 @@
+from markdown import Markdown
+from ursus.config import config
+
+
+markdown_text = """
+```python
+def double(x):
+    return x * 2  # <b>
+```
+
+    :::js
+    var a = 1 < 2;
+
+~~~ {.bash .extra hl_lines="1"}
+echo "Hello"
+~~~
+"""
+
+
+def test_highlight_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "cache_path", tmp_path)
+    extensions = ["codehilite", "fenced_code"]
+    expected_html = Markdown(extensions=extensions).convert(markdown_text)
+
+    markdown = Markdown(extensions=[*extensions, "highlight_cache"])
+    assert markdown.convert(markdown_text) == expected_html
+    assert markdown.reset().convert(markdown_text) == expected_html
+    assert Markdown(extensions=[*extensions, "highlight_cache"]).convert(markdown_text) == expected_html
+
+
+def test_element_processors(monkeypatch):
+    monkeypatch.setattr(config, "site_url", "https://example.com")
+    markdown = Markdown(extensions=["base_url", "tasklist"])
+    assert "ursus_elements" in markdown.treeprocessors
+    assert markdown.convert("- [x] [Done](/done)\n- [ ] Todo\n- [Relative](relative)") == (
+        "<ul>\n"
+        '<li><input checked="checked" type="checkbox" /><a href="https://example.com/done">Done</a></li>\n'
+        '<li><input type="checkbox" />Todo</li>\n'
+        '<li><a href="relative">Relative</a></li>\n'
+        "</ul>"
+    )
+
+
+def test_tasklist_runs_before_inline_patterns():
+    markdown = Markdown(extensions=["tasklist"])
+    assert markdown.convert("- [x] [y] item\n\n[y]: https://example.com") == (
+        "<ul>\n"
+        '<li><input checked="checked" type="checkbox" /><a href="https://example.com">y</a> item</li>\n'
+        "</ul>"
+    )
+
+
+def test_responsive_image_with_escaped_characters(monkeypatch):
+    monkeypatch.setattr(config, "site_url", "https://example.com")
+    markdown = Markdown(extensions=["responsive_images"])
+    transform = {"max_size": (300, 300), "output_mimetype": "image/jpeg", "output_path": "images/foo_bar.300.jpg"}
+    markdown.context = {"entries": {"images/foo_bar.jpg": {"transforms": [transform]}}}
+    assert markdown.convert("![Photo](/images/foo\\_bar.jpg)") == (
+        '<picture><source srcset="https://example.com/images/foo_bar.300.jpg 300w" type="image/jpeg" />'
+        '<img alt="Photo" loading="lazy" src="https://example.com/images/foo_bar.300.jpg" /></picture>'
+    )
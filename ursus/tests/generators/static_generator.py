@@ -0,0 +1,151 @@
+from pathlib import Path
+from ursus import build, merge
+from ursus.config import config
+from ursus.generators.static import StaticSiteGenerator, get_git_changed_files, get_stable_repr
+from ursus.sinks.archive import ArchiveSink
+import git
+import pytest
+
+
+def test_stable_repr_ignores_memory_addresses():
+    class Settings:
+        pass
+
+    assert get_stable_repr({"b": Settings(), "a": [len]}) == get_stable_repr({"a": [len], "b": Settings()})
+
+
+def test_changed_files_since_last_build(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "cache_path", tmp_path / "cache")
+    monkeypatch.setattr(config, "content_path", tmp_path / "content")
+    monkeypatch.setattr(config, "templates_path", tmp_path / "templates")
+    monkeypatch.setattr(config, "output_path", tmp_path / "output")
+    monkeypatch.setattr(config, "context_processors", [])
+    monkeypatch.setattr(config, "renderers", [])
+    for path in (config.content_path, config.templates_path, config.output_path):
+        path.mkdir()
+    (config.content_path / "unchanged.md").write_text("Unchanged")
+    (config.content_path / "changed.md").write_text("Before")
+    (config.content_path / "deleted.md").write_text("Deleted")
+
+    generator = StaticSiteGenerator()
+    assert generator.get_changed_files(generator.get_source_hashes()) is None
+    generator.generate_incremental()
+
+    (config.content_path / "changed.md").write_text("After")
+    (config.content_path / "deleted.md").unlink()
+    (config.templates_path / "added.html.jinja").write_text("Added")
+    assert generator.get_changed_files(generator.get_source_hashes()) == {
+        config.content_path / "changed.md",
+        config.content_path / "deleted.md",
+        config.templates_path / "added.html.jinja",
+    }
+
+    monkeypatch.setattr(config, "minify_css", True)
+    assert generator.get_changed_files(generator.get_source_hashes()) is None
+
+
+def test_git_changed_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "content_path", tmp_path / "content")
+    monkeypatch.setattr(config, "templates_path", tmp_path / "templates")
+    config.content_path.mkdir()
+    config.templates_path.mkdir()
+    (config.content_path / "unchanged.md").write_text("Unchanged")
+    (config.content_path / "changed.md").write_text("Before")
+    (config.content_path / "deleted.md").write_text("Deleted")
+    (config.templates_path / "renamed.html.jinja").write_text("Renamed")
+
+    repo = git.Repo.init(tmp_path)
+    repo.index.add(["content", "templates"])
+    repo.index.commit("First commit")
+
+    (config.content_path / "changed.md").write_text("After")
+    (config.content_path / "untracked.md").write_text("Untracked")
+    repo.index.remove(["content/deleted.md"], working_tree=True)
+    repo.index.move(["templates/renamed.html.jinja", "templates/new-name.html.jinja"])
+
+    assert get_git_changed_files("HEAD") == {
+        config.content_path / "changed.md",
+        config.content_path / "deleted.md",
+        config.content_path / "untracked.md",
+        config.templates_path / "renamed.html.jinja",
+        config.templates_path / "new-name.html.jinja",
+    }
+
+
+def test_git_changed_files_in_symlinked_directory(tmp_path, monkeypatch):
+    (tmp_path / "repo/content").mkdir(parents=True)
+    (tmp_path / "repo/templates").mkdir()
+    (tmp_path / "repo/content/changed.md").write_text("Before")
+    (tmp_path / "content").symlink_to(tmp_path / "repo/content")
+    monkeypatch.setattr(config, "content_path", tmp_path / "content")
+    monkeypatch.setattr(config, "templates_path", tmp_path / "repo/templates")
+
+    repo = git.Repo.init(tmp_path / "repo")
+    repo.index.add(["content"])
+    repo.index.commit("First commit")
+    (config.content_path / "changed.md").write_text("After")
+
+    assert get_git_changed_files("HEAD") == {config.content_path / "changed.md"}
+
+
+def test_since_requires_partial_builds(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "output_sink", ArchiveSink(tmp_path / "site.zip"))
+
+    with pytest.raises(ValueError):
+        StaticSiteGenerator().generate_since("HEAD")
+
+
+def get_output_files(output_path: Path) -> dict[Path, bytes]:
+    return {path.relative_to(output_path): path.read_bytes() for path in output_path.rglob("*") if path.is_file()}
+
+
+def test_merged_shards_match_unsharded_build(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "content_path", tmp_path / "content")
+    monkeypatch.setattr(config, "templates_path", tmp_path / "templates")
+    monkeypatch.setattr(config, "output_path", tmp_path / "output")
+    monkeypatch.setattr(config, "shard", None)
+    monkeypatch.setattr(config, "persistent_cache", False)
+    monkeypatch.setattr(config, "output_sink", None)
+    monkeypatch.setattr(
+        config,
+        "renderers",
+        [
+            "ursus.renderers.static.StaticAssetRenderer",
+            "ursus.renderers.jinja.JinjaRenderer",
+            "ursus.renderers.lunr.LunrIndexRenderer",
+            "ursus.renderers.service_worker.ServiceWorkerRenderer",
+        ],
+    )
+    monkeypatch.setattr(
+        config,
+        "lunr_indexes",
+        {"indexed_fields": ("title", "body"), "indexes": [{"uri_pattern": "posts/*.md", "returned_fields": ("url",)}]},
+    )
+    monkeypatch.setattr(config, "precache_patterns", ["*.html", "*.css"])
+
+    (config.content_path / "posts").mkdir(parents=True)
+    for number in range(10):
+        post_path = config.content_path / f"posts/post-{number}.md"
+        post_path.write_text(f"---\ntitle: Post {number}\n---\nPost body {number}")
+    (config.templates_path / "posts").mkdir(parents=True)
+    (config.templates_path / "posts/entry.html.jinja").write_text("<h1>{{ entry.title }}</h1>{{ entry.body }}")
+    (config.templates_path / "index.html.jinja").write_text(
+        "{% for post in get_entries('posts', sort_by='title') %}{{ post.title }}{% endfor %}"
+    )
+    (config.templates_path / "style.css").write_text("body { color: red; }")
+
+    build()
+    unsharded_files = get_output_files(config.output_path)
+    assert Path("search-index.json") in unsharded_files
+    assert Path("precache-manifest.json") in unsharded_files
+
+    for shard_number in (1, 2, 3):
+        # build() sets config.output_path to the shard's output directory
+        monkeypatch.setattr(config, "output_path", tmp_path / "merged")
+        build(shard=(shard_number, 3))
+        assert len(get_output_files(config.output_path)) < len(unsharded_files)
+    monkeypatch.setattr(config, "output_path", tmp_path / "merged")
+    monkeypatch.setattr(config, "shard", None)
+    merge()
+
+    assert get_output_files(config.output_path) == unsharded_files
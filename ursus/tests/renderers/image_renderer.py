@@ -0,0 +1,235 @@
+from pathlib import Path
+from PIL import Image
+from ursus.config import config
+from ursus.renderers.image import ImageTransformQueue, ImageTransformRenderer, image_transform_queue
+from ursus.sinks.archive import ArchiveSink
+from ursus.utils import get_image_encoder_profile, get_image_transforms
+import os
+import pytest
+import threading
+import ursus
+
+
+def start_blocking_job(queue: ImageTransformQueue, output_path: Path) -> tuple[threading.Event, list]:
+    """Queues a job that runs until the returned event is set, and waits until the background thread runs it"""
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def job():
+        runs.append(threading.current_thread())
+        started.set()
+        release.wait(5)
+
+    queue.add(output_path, job)
+    assert started.wait(5)
+    return release, runs
+
+
+def test_queued_jobs_run_in_background():
+    queue = ImageTransformQueue()
+    done = threading.Event()
+    queue.add(Path("photo.jpg"), done.set)
+
+    assert done.wait(5)
+    assert queue.render(Path("photo.jpg")) is False
+
+
+def test_requested_job_runs_immediately():
+    queue = ImageTransformQueue()
+    release, _ = start_blocking_job(queue, Path("busy.jpg"))
+
+    runs = []
+    queue.add(Path("photo.jpg"), lambda: runs.append(threading.current_thread()))
+    requester = threading.Thread(target=queue.render, args=(Path("photo.jpg"),))
+    requester.start()
+    release.set()
+    requester.join(5)
+
+    # The job was taken from the queue, so it ran once, in the thread that requested it
+    assert runs == [requester]
+    assert not queue.jobs
+
+
+def test_request_waits_for_job_in_progress():
+    queue = ImageTransformQueue()
+    release, runs = start_blocking_job(queue, Path("photo.jpg"))
+
+    results = []
+    requester = threading.Thread(target=lambda: results.append(queue.render(Path("photo.jpg"))))
+    requester.start()
+    requester.join(0.2)
+    assert requester.is_alive()
+
+    release.set()
+    requester.join(5)
+    assert results == [True]
+    assert len(runs) == 1
+
+
+def test_no_lazy_transforms_without_partial_builds(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "content_path", tmp_path / "content")
+    monkeypatch.setattr(config, "persistent_cache", False)
+    monkeypatch.setattr(config, "lazy_image_transforms", True)
+    monkeypatch.setattr(config, "image_transforms", {"": {"max_size": (10, 10)}})
+    monkeypatch.setattr(config, "output_sink", ArchiveSink(tmp_path / "site.tar"))
+    config.content_path.mkdir()
+    Image.new("RGB", (20, 20)).save(config.content_path / "photo.png")
+
+    transform = next(get_image_transforms(Path("photo.png"), (20, 20)))
+    ImageTransformRenderer().render_transform(config.content_path / "photo.png", transform)
+
+    assert transform["output_path"] not in image_transform_queue.jobs
+    assert config.output_sink.exists(transform["output_path"])
+    config.output_sink.close()
+
+
+def test_transform_settings_change_without_persistent_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "content_path", tmp_path / "content")
+    monkeypatch.setattr(config, "output_path", tmp_path / "output")
+    monkeypatch.setattr(config, "persistent_cache", False)
+    monkeypatch.setattr(config, "lazy_image_transforms", False)
+    monkeypatch.setattr(config, "content_source", None)
+    monkeypatch.setattr(config, "output_sink", None)
+    config.content_path.mkdir()
+    Image.new("RGB", (600, 400)).save(config.content_path / "photo.png")
+    abs_file_path = config.content_path / "photo.png"
+
+    monkeypatch.setattr(config, "image_transforms", {"": {"max_size": (300, 300)}})
+    transform = next(get_image_transforms(Path("photo.png"), (600, 400)))
+    ImageTransformRenderer().render_transform(abs_file_path, transform)
+
+    # A new run with other settings does not reuse the output of the previous run, even if it's newer than the original
+    monkeypatch.setattr(config, "image_transforms", {"": {"max_size": (200, 200)}})
+    transform = next(get_image_transforms(Path("photo.png"), (600, 400)))
+    ImageTransformRenderer().render_transform(abs_file_path, transform)
+    with Image.open(config.output_path / transform["output_path"]) as output_image:
+        assert output_image.size == (200, 133)
+
+
+def test_evict_cached_variants(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "cache_path", tmp_path / "cache")
+    monkeypatch.setattr(config, "image_transform_cache_size", 25)
+    cached_variants_path = config.cache_path / "image_transforms" / "ab"
+    cached_variants_path.mkdir(parents=True)
+    for index, name in enumerate(("oldest.jpg", "linked.jpg", "old.jpg", "new.jpg")):
+        (cached_variants_path / name).write_bytes(b"0123456789")
+        os.utime(cached_variants_path / name, ns=(index * 10**9,) * 2)
+    os.link(cached_variants_path / "linked.jpg", tmp_path / "output.jpg")
+
+    ImageTransformRenderer().evict_cached_variants()
+
+    assert sorted(path.name for path in cached_variants_path.iterdir()) == ["linked.jpg", "new.jpg"]
+
+
+def test_image_encoder_profile_selection(monkeypatch):
+    monkeypatch.setattr(config, "image_encoder_profile", None)
+    assert get_image_encoder_profile()["name"] == "production"
+    assert get_image_encoder_profile()["resample"] == "lanczos"
+
+    monkeypatch.setattr(config, "image_encoder_profile", "draft")
+    assert get_image_encoder_profile()["name"] == "draft"
+    assert get_image_encoder_profile()["resample"] == "bilinear"
+    assert get_image_encoder_profile()["reducing_gap"] == 1.5
+
+
+class StopWatching(Exception):
+    pass
+
+
+def stop_watching(seconds):
+    raise StopWatching()
+
+
+@pytest.mark.parametrize("profile, expected_profile", [(None, "draft"), ("production", "production")])
+def test_watch_mode_uses_draft_profile(tmp_path, monkeypatch, profile, expected_profile):
+    monkeypatch.setattr(config, "content_path", tmp_path / "content")
+    monkeypatch.setattr(config, "templates_path", tmp_path / "templates")
+    monkeypatch.setattr(config, "output_path", tmp_path / "output")
+    monkeypatch.setattr(config, "persistent_cache", False)
+    monkeypatch.setattr(config, "output_sink", None)
+    monkeypatch.setattr(config, "renderers", [])
+    monkeypatch.setattr(config, "image_encoder_profile", profile)
+    monkeypatch.setattr(ursus.time, "sleep", stop_watching)
+    config.content_path.mkdir()
+    config.templates_path.mkdir()
+
+    with pytest.raises(StopWatching):
+        ursus.build(watch_for_changes=True)
+    assert config.image_encoder_profile == expected_profile
+
+
+def test_profile_is_part_of_variant_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "content_path", tmp_path)
+    monkeypatch.setattr(config, "content_source", None)
+    Image.new("RGB", (20, 20)).save(tmp_path / "photo.png")
+    transform = next(get_image_transforms(Path("photo.png"), (20, 20)))
+    renderer = ImageTransformRenderer()
+
+    monkeypatch.setattr(config, "image_encoder_profile", "production")
+    production_key = renderer.get_variant_key(tmp_path / "photo.png", transform)
+    monkeypatch.setattr(config, "image_encoder_profile", "draft")
+    assert renderer.get_variant_key(tmp_path / "photo.png", transform) != production_key
+
+
+def test_draft_build_keeps_release_variants(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "content_path", tmp_path / "content")
+    monkeypatch.setattr(config, "output_path", tmp_path / "output")
+    monkeypatch.setattr(config, "cache_path", tmp_path / "cache")
+    monkeypatch.setattr(config, "persistent_cache", True)
+    monkeypatch.setattr(config, "lazy_image_transforms", False)
+    monkeypatch.setattr(config, "content_source", None)
+    monkeypatch.setattr(config, "output_sink", None)
+    monkeypatch.setattr(config, "image_transforms", {"": {"max_size": (300, 300)}})
+    config.content_path.mkdir()
+    Image.effect_mandelbrot((600, 400), (-2, -1.2, 1, 1.2), 100).convert("RGB").save(config.content_path / "photo.png")
+    abs_file_path = config.content_path / "photo.png"
+    transform = next(get_image_transforms(Path("photo.png"), (600, 400)))
+    output_path = config.output_path / transform["output_path"]
+    renderer = ImageTransformRenderer()
+
+    monkeypatch.setattr(config, "image_encoder_profile", "production")
+    renderer.render_transform(abs_file_path, transform)
+    production_output = output_path.read_bytes()
+    production_key = renderer.get_variant_key(abs_file_path, transform)
+    production_variant_path = renderer.get_cached_variant_path(production_key, output_path.suffix)
+
+    monkeypatch.setattr(config, "image_encoder_profile", "draft")
+    renderer.render_transform(abs_file_path, transform)
+    assert output_path.read_bytes() != production_output
+    assert production_variant_path.read_bytes() == production_output
+
+    # The release build restores the release variant from the cache, instead of reusing the draft output
+    monkeypatch.setattr(config, "image_encoder_profile", "production")
+    monkeypatch.setattr(renderer, "encode_transform", None)
+    renderer.render_transform(abs_file_path, transform)
+    assert output_path.read_bytes() == production_output
+
+
+def test_production_build_after_draft_build_without_persistent_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "content_path", tmp_path / "content")
+    monkeypatch.setattr(config, "persistent_cache", False)
+    monkeypatch.setattr(config, "lazy_image_transforms", False)
+    monkeypatch.setattr(config, "content_source", None)
+    monkeypatch.setattr(config, "output_sink", None)
+    monkeypatch.setattr(config, "image_transforms", {"": {"max_size": (300, 300)}})
+    config.content_path.mkdir()
+    Image.effect_mandelbrot((600, 400), (-2, -1.2, 1, 1.2), 100).convert("RGB").save(config.content_path / "photo.png")
+    abs_file_path = config.content_path / "photo.png"
+    transform = next(get_image_transforms(Path("photo.png"), (600, 400)))
+
+    # A clean production build
+    monkeypatch.setattr(config, "output_path", tmp_path / "clean")
+    monkeypatch.setattr(config, "image_encoder_profile", "production")
+    ImageTransformRenderer().render_transform(abs_file_path, transform)
+    production_output = (config.output_path / transform["output_path"]).read_bytes()
+
+    # A watch session with the draft profile, then a production build in a new run
+    monkeypatch.setattr(config, "output_path", tmp_path / "output")
+    monkeypatch.setattr(config, "image_encoder_profile", "draft")
+    ImageTransformRenderer().render_transform(abs_file_path, transform)
+    assert (config.output_path / transform["output_path"]).read_bytes() != production_output
+
+    monkeypatch.setattr(config, "image_encoder_profile", "production")
+    ImageTransformRenderer().render_transform(abs_file_path, transform)
+    assert (config.output_path / transform["output_path"]).read_bytes() == production_output
@@ -0,0 +1,247 @@
+from jinja2 import Environment
+from pathlib import Path
+from ursus.config import config
+from ursus.generators.static import StaticSiteGenerator
+from ursus.renderers import jinja
+from ursus.renderers.jinja import JinjaRenderer, asset_url, render_filter
+
+
+def render(template: str) -> str:
+    environment = Environment(extensions=["ursus.renderers.jinja.JsLoaderExtension"])
+    return environment.from_string(template).render()
+
+
+template = "{% js %}alert('Hello!');{% endjs %}{% js %}alert('Hello!');{% endjs %}{% alljs %}"
+
+
+def test_inline_js():
+    assert render(template) == "alert('Hello!');"
+
+
+def test_js_bundle(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "output_path", tmp_path)
+    monkeypatch.setattr(config, "site_url", "https://example.com")
+    monkeypatch.setattr(config, "fragment_bundle_path", Path("bundles"))
+
+    output = render(template)
+    bundles = list((tmp_path / "bundles").glob("*.js"))
+    assert len(bundles) == 1
+    assert bundles[0].read_text() == "alert('Hello!');"
+    assert output == f'<script src="https://example.com/bundles/{bundles[0].name}"></script>'
+    assert render(template) == output
+
+
+def test_entry_templates(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "templates_path", tmp_path)
+    monkeypatch.setattr(config, "persistent_cache", False)
+    (tmp_path / "posts").mkdir()
+    for template in ("index.html.jinja", "posts/entry.html.jinja", "posts/entry.json.jinja", "posts/hello.html.jinja"):
+        (tmp_path / template).touch()
+
+    renderer = JinjaRenderer()
+    assert renderer.get_entry_templates("posts/world.md") == [
+        Path("posts/entry.html.jinja"),
+        Path("posts/entry.json.jinja"),
+    ]
+    assert renderer.get_entry_templates("posts/hello.md") == [
+        Path("posts/hello.html.jinja"),
+        Path("posts/entry.json.jinja"),
+    ]
+    assert renderer.get_entry_templates("index.md") == [Path("index.html.jinja")]
+    assert renderer.get_entry_templates("pages/hello.md") == []
+
+    (tmp_path / "posts/hello.html.jinja").unlink()
+    (tmp_path / "posts/world.json.jinja").touch()
+    renderer.update_template_index({tmp_path / "posts/hello.html.jinja", tmp_path / "posts/world.json.jinja"})
+    assert renderer.get_entry_templates("posts/hello.md") == [
+        Path("posts/entry.html.jinja"),
+        Path("posts/entry.json.jinja"),
+    ]
+    assert renderer.get_entry_templates("posts/world.md") == [
+        Path("posts/world.json.jinja"),
+        Path("posts/entry.html.jinja"),
+    ]
+
+
+def test_affected_templates(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "templates_path", tmp_path)
+    monkeypatch.setattr(config, "persistent_cache", False)
+    (tmp_path / "_layout.html.jinja").write_text('<style>{% include "style.css" %}</style>{% block body %}{% endblock %}')
+    (tmp_path / "_post.html.jinja").write_text('{% extends "_layout.html.jinja" %}')
+    (tmp_path / "index.html.jinja").write_text('{% extends "_layout.html.jinja" %}')
+    (tmp_path / "entry.html.jinja").write_text('{% extends "_post.html.jinja" %}')
+    (tmp_path / "about.html.jinja").write_text("About")
+    (tmp_path / "style.css").write_text("body { color: red; }")
+
+    renderer = JinjaRenderer()
+    assert renderer.get_affected_templates({Path("style.css")}) == {
+        Path("_layout.html.jinja"),
+        Path("_post.html.jinja"),
+        Path("index.html.jinja"),
+        Path("entry.html.jinja"),
+    }
+    assert renderer.get_affected_templates({Path("_post.html.jinja")}) == {Path("entry.html.jinja")}
+
+    (tmp_path / "about.html.jinja").write_text("{% include entry.template %}")
+    assert renderer.get_affected_templates({Path("about.html.jinja")}) == set()
+    assert renderer.get_affected_templates({Path("style.css")}) == {
+        Path("_layout.html.jinja"),
+        Path("_post.html.jinja"),
+        Path("index.html.jinja"),
+        Path("entry.html.jinja"),
+        Path("about.html.jinja"),
+    }
+
+
+def test_affected_templates_with_binary_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "templates_path", tmp_path)
+    monkeypatch.setattr(config, "persistent_cache", False)
+    (tmp_path / "index.html.jinja").write_text('<img src="/images/logo.png">')
+    (tmp_path / "broken.html.jinja").write_text("{% if %}")
+    (tmp_path / "images").mkdir()
+    (tmp_path / "images/logo.png").write_bytes(b"\x89PNG\r\n\x1a\n\xff\xfe")
+
+    renderer = JinjaRenderer()
+    assert renderer.get_affected_templates({Path("images/logo.png")}) == set()
+    assert renderer.get_affected_templates({Path("broken.html.jinja")}) == set()
+
+    # Binary files that templates include are in the dependency graph, but they don't reference anything
+    (tmp_path / "index.html.jinja").write_text('{% include "images/logo.png" %}')
+    assert renderer.get_affected_templates({Path("index.html.jinja")}) == set()
+    assert renderer.get_affected_templates({Path("images/logo.png")}) == {Path("index.html.jinja")}
+
+
+def test_render_filter():
+    environment = Environment()
+    environment.filters["render"] = render_filter
+    template = environment.from_string("{{ value|render }}")
+
+    for value in ("Hello {{ name }}!\n", "Hello {# comment #}world\r\n", "Hello world\n\n", "Hello world"):
+        assert template.render(value=value, name="world") == environment.from_string(value).render(name="world")
+    assert len(environment.render_filter_cache) == 2
+
+
+def test_fragment_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "content_path", tmp_path / "content")
+    monkeypatch.setattr(config, "templates_path", tmp_path / "templates")
+    environment = Environment(extensions=["ursus.renderers.jinja.FragmentCacheExtension"])
+    template = environment.from_string('{% cache "nav", "posts" %}{{ count }}{% endcache %}')
+    extension = environment.extensions["ursus.renderers.jinja.FragmentCacheExtension"]
+
+    assert template.render(count=1) == "1"
+    assert template.render(count=2) == "1"
+
+    extension.invalidate({config.content_path / "pages/about.md"})
+    assert template.render(count=3) == "1"
+
+    extension.invalidate({config.content_path / "posts/hello.md"})
+    assert template.render(count=4) == "4"
+
+    extension.invalidate({config.templates_path / "_nav.html.jinja"})
+    assert template.render(count=5) == "5"
+
+    extension.invalidate(None)
+    assert template.render(count=6) == "6"
+
+
+def test_fragment_cache_replays_queued_fragments():
+    environment = Environment(
+        extensions=["ursus.renderers.jinja.FragmentCacheExtension", "ursus.renderers.jinja.JsLoaderExtension"]
+    )
+    template = environment.from_string(
+        "{% js %}first();{% endjs %}"
+        '{% cache "nav" %}{% js %}nav({{ count }});{% endjs %}{{ count }}{% endcache %}'
+        "{% js %}last();{% endjs %}{% alljs %}"
+    )
+
+    assert template.render(count=1) == "1first();\nnav(1);\nlast();"
+    assert template.render(count=2) == "1first();\nnav(1);\nlast();"
+
+
+def test_asset_url(monkeypatch):
+    monkeypatch.setattr(config, "site_url", "https://example.com")
+    environment = Environment()
+    environment.globals["asset_url"] = asset_url
+    template = environment.from_string("{{ asset_url('/css/style.css') }} {{ asset_url('app.js') }}")
+
+    assert template.render(asset_manifest={"css/style.css": "css/style.2f4dbe1e.css"}) == (
+        "https://example.com/css/style.2f4dbe1e.css https://example.com/app.js"
+    )
+
+
+def test_scss_cache_key_is_computed_once_per_build(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "templates_path", tmp_path)
+    monkeypatch.setattr(config, "persistent_cache", False)
+    (tmp_path / "_vars.scss").write_text("$color: red;")
+
+    hashed_files = []
+    get_file_hash = jinja.get_file_hash
+    monkeypatch.setattr(jinja, "get_file_hash", lambda path: hashed_files.append(path) or get_file_hash(path))
+
+    environment = Environment(extensions=["ursus.renderers.jinja.ScssLoaderExtension"])
+    template = environment.from_string('{% scss %}@import "vars"; p { color: $color; }{% endscss %}')
+    assert "red" in template.render()
+    assert "red" in template.render()
+    assert hashed_files == [tmp_path / "_vars.scss"]
+
+    (tmp_path / "_vars.scss").write_text("$color: blue;")
+    for extension in environment.extensions.values():
+        extension.invalidate({tmp_path / "_vars.scss"})
+    assert "blue" in template.render()
+
+
+def test_minified_code_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(config, "minify_js", True)
+    monkeypatch.setattr(jinja, "minified_code_cache_size", 2)
+    environment = Environment(extensions=["ursus.renderers.jinja.JsLoaderExtension"])
+    extension = environment.extensions["ursus.renderers.jinja.JsLoaderExtension"]
+    template = environment.from_string("{% js %}alert( {{ number }} );{% endjs %}{% alljs %}")
+
+    for number in range(5):
+        assert template.render(number=number) == f"alert({number});"
+    assert len(extension.minified_code_cache) == 2
+
+
+def test_fast_rebuild_keeps_bundles_of_previous_build(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "content_path", tmp_path / "content")
+    monkeypatch.setattr(config, "templates_path", tmp_path / "templates")
+    monkeypatch.setattr(config, "output_path", tmp_path / "output")
+    monkeypatch.setattr(config, "persistent_cache", False)
+    monkeypatch.setattr(config, "output_sink", None)
+    monkeypatch.setattr(config, "renderers", ["ursus.renderers.jinja.JinjaRenderer"])
+    monkeypatch.setattr(config, "fragment_bundle_path", Path("bundles"))
+    monkeypatch.setattr(config, "fast_rebuilds", False)
+    config.content_path.mkdir()
+    config.templates_path.mkdir()
+    (config.templates_path / "a.html.jinja").write_text("{% js %}alert('a');{% endjs %}{% alljs %}")
+    (config.templates_path / "b.html.jinja").write_text("B")
+
+    StaticSiteGenerator().generate()
+    bundles = list((config.output_path / "bundles").iterdir())
+    assert len(bundles) == 1
+
+    # A new process only renders the changed template. a.html still uses the bundle.
+    monkeypatch.setattr(config, "fast_rebuilds", True)
+    (config.templates_path / "b.html.jinja").write_text("B again")
+    StaticSiteGenerator().generate({config.templates_path / "b.html.jinja"})
+    assert (config.output_path / "b.html").read_text() == "B again"
+    assert bundles[0].name in (config.output_path / "a.html").read_text()
+    assert bundles[0].exists()
+
+    # A full build deletes the bundles that are no longer used
+    monkeypatch.setattr(config, "fast_rebuilds", False)
+    (config.templates_path / "a.html.jinja").write_text("A")
+    StaticSiteGenerator().generate()
+    assert not bundles[0].exists()
+
+
+def test_unwritable_bytecode_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "templates_path", tmp_path)
+    monkeypatch.setattr(config, "persistent_cache", True)
+    monkeypatch.setattr(config, "jinja_bytecode_cache", True)
+    # The cache path is a file, so the cache directory can't be created
+    monkeypatch.setattr(config, "cache_path", tmp_path / "cache")
+    config.cache_path.write_text("Not a directory")
+
+    renderer = JinjaRenderer()
+    assert renderer.template_environment.bytecode_cache is None
@@ -0,0 +1,28 @@
+from ursus.config import config
+from ursus.renderers.sass import SassRenderer, get_scss_imports
+
+
+def test_scss_imports():
+    scss = """
+        @use "sass:math";
+        @use 'vars' as v;
+        @import "reset.css", "components/button", url(fonts.css);
+        @forward "mixins";
+    """
+    assert get_scss_imports(scss) == ["vars", "components/button", "mixins"]
+
+
+def test_partials_are_dependencies(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "templates_path", tmp_path)
+    (tmp_path / "components").mkdir()
+    (tmp_path / "_vars.scss").write_text("$color: red;")
+    (tmp_path / "components" / "_button.scss").write_text('@import "../vars";')
+    (tmp_path / "components" / "_index.scss").write_text('@forward "button";')
+    (tmp_path / "style.scss").write_text('@import "components";')
+
+    assert SassRenderer().get_dependencies(tmp_path / "style.scss") == {
+        tmp_path / "style.scss",
+        tmp_path / "components" / "_index.scss",
+        tmp_path / "components" / "_button.scss",
+        tmp_path / "_vars.scss",
+    }
@@ -0,0 +1,36 @@
+from pathlib import Path
+from ursus.config import config
+from ursus.renderers.service_worker import ServiceWorkerRenderer
+from ursus.sinks.memory import MemorySink
+import hashlib
+import json
+
+
+def test_precache_manifest(monkeypatch):
+    monkeypatch.setattr(config, "output_sink", MemorySink())
+    monkeypatch.setattr(config, "site_url", "https://example.com")
+    monkeypatch.setattr(config, "precache_patterns", ["css/*.css", "index.html", "images/*.webp"])
+    config.output_sink.write_text(Path("index.html"), "Hello")
+    config.output_sink.write_text(Path("blog/index.html"), "Blog")
+    config.output_sink.write_text(Path("css/style.css"), "body {}")
+    config.output_sink.write_text(Path("css/vendor/reset.css"), "* {}")
+    config.output_sink.write_text(Path("about.html"), "About")
+    output_files = set(config.output_sink.files)
+    # Queued image transforms are in the output files, but they are not written yet
+    context = {"output_files": output_files | {Path("images/photo.webp")}}
+
+    renderer = ServiceWorkerRenderer()
+    assert renderer.render(context) == {config.precache_manifest_output_path, config.service_worker_output_path}
+    assert json.loads(config.output_sink.files[config.precache_manifest_output_path]) == [
+        {"url": "https://example.com/css/style.css", "revision": hashlib.sha256(b"body {}").hexdigest()},
+        {"url": "https://example.com/index.html", "revision": hashlib.sha256(b"Hello").hexdigest()},
+    ]
+
+    # Unchanged files are not written again
+    service_worker = config.output_sink.files[config.service_worker_output_path]
+    renderer.render(context)
+    assert config.output_sink.files[config.service_worker_output_path] is service_worker
+
+    config.output_sink.write_text(Path("css/style.css"), "body { margin: 0; }")
+    renderer.render(context)
+    assert config.output_sink.files[config.service_worker_output_path] != service_worker
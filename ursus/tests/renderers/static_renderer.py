@@ -0,0 +1,61 @@
+from pathlib import Path
+from ursus.config import config
+from ursus.renderers.static import StaticAssetRenderer
+
+
+class ListingRenderer(StaticAssetRenderer):
+    def get_files_to_copy(self, changed_files: set[Path] | None = None) -> list[tuple[Path, Path]]:
+        self.listed_files = super().get_files_to_copy(changed_files)
+        return self.listed_files
+
+
+def test_only_changed_assets_are_listed(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "templates_path", tmp_path / "templates")
+    monkeypatch.setattr(config, "output_path", tmp_path / "output")
+    config.templates_path.mkdir()
+    (config.templates_path / "style.css").write_text("body {}")
+    (config.templates_path / "script.js").write_text("alert('Hello!');")
+    (config.templates_path / "index.html.jinja").write_text("Hello!")
+
+    renderer = ListingRenderer()
+    assert renderer.render({}) == {Path("style.css"), Path("script.js")}
+
+    (config.templates_path / "script.js").unlink()
+    (config.templates_path / "logo.svg").write_text("<svg/>")
+    changed_files = {config.templates_path / "script.js", config.templates_path / "logo.svg"}
+    assert renderer.render({}, changed_files) == {Path("style.css"), Path("logo.svg")}
+    assert renderer.listed_files == [(config.templates_path / "logo.svg", Path("logo.svg"))]
+    assert (config.output_path / "logo.svg").read_text() == "<svg/>"
+
+
+def test_moved_asset_directories(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "templates_path", tmp_path / "templates")
+    monkeypatch.setattr(config, "output_path", tmp_path / "output")
+    (config.templates_path / "fonts").mkdir(parents=True)
+    (config.templates_path / "fonts/a.woff").write_text("A")
+    (config.templates_path / "style.css").write_text("body {}")
+
+    renderer = StaticAssetRenderer()
+    assert renderer.render({}) == {Path("style.css"), Path("fonts/a.woff")}
+
+    # A moved directory is a single change, for the directory
+    (config.templates_path / "fonts").rename(config.templates_path / "webfonts")
+    assert renderer.render({}, {config.templates_path / "fonts"}) == {Path("style.css")}
+    assert renderer.render({}, {config.templates_path / "webfonts"}) == {Path("style.css"), Path("webfonts/a.woff")}
+    assert (config.output_path / "webfonts/a.woff").read_text() == "A"
+
+
+def test_fingerprinted_assets(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "templates_path", tmp_path / "templates")
+    monkeypatch.setattr(config, "output_path", tmp_path / "output")
+    monkeypatch.setattr(config, "fingerprint_assets", True)
+    (config.templates_path / "css").mkdir(parents=True)
+    (config.templates_path / "css/style.css").write_text("body {}")
+
+    context = {"asset_manifest": {}}
+    files_to_keep = StaticAssetRenderer().render(context)
+
+    fingerprinted_path = context["asset_manifest"]["css/style.css"]
+    assert fingerprinted_path == "css/style.62368a1a.css"
+    assert files_to_keep == {Path("css/style.css"), Path(fingerprinted_path)}
+    assert (config.output_path / fingerprinted_path).read_text() == "body {}"
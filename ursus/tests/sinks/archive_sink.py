@@ -0,0 +1,44 @@
+from pathlib import Path
+from ursus.sinks.archive import ArchiveSink
+import pytest
+import tarfile
+import zipfile
+
+
+def read_archive(archive_path: Path) -> dict[str, bytes]:
+    if archive_path.suffix == ".zip":
+        with zipfile.ZipFile(archive_path) as archive:
+            return {name: archive.read(name) for name in archive.namelist()}
+    with tarfile.open(archive_path) as archive:
+        return {member.name: archive.extractfile(member).read() for member in archive.getmembers()}
+
+
+@pytest.mark.parametrize("archive_name", ["website.tar", "website.tar.gz", "website.zip"])
+def test_archive_sink(tmp_path, archive_name):
+    source_path = tmp_path / "style.css"
+    source_path.write_text("body {}")
+
+    sink = ArchiveSink(tmp_path / archive_name)
+    sink.write_text(Path("index.html"), "<h1>Hello</h1>")
+    with sink.open(Path("images/photo.jpg")) as file:
+        file.write(b"photo")
+    sink.copy_file(source_path, Path("css/style.css"))
+    sink.duplicate(Path("images/photo.jpg"), Path("images/small/photo.jpg"))
+    assert sink.exists(Path("images/small/photo.jpg"))
+    sink.close()
+
+    assert read_archive(tmp_path / archive_name) == {
+        "index.html": b"<h1>Hello</h1>",
+        "images/photo.jpg": b"photo",
+        "images/small/photo.jpg": b"photo",
+        "css/style.css": b"body {}",
+    }
+    assert not sink.exists(Path("index.html"))
+
+
+def test_archive_files_can_not_be_overwritten(tmp_path):
+    sink = ArchiveSink(tmp_path / "website.tar")
+    sink.write_text(Path("index.html"), "Hello")
+    with pytest.raises(ValueError):
+        sink.write_text(Path("index.html"), "Hello again")
+    sink.close()
@@ -0,0 +1,47 @@
+from pathlib import Path
+from ursus.config import config
+from ursus.generators.static import StaticSiteGenerator
+from ursus.linters.footnotes import OrphanFootnotesLinter
+from ursus.sinks.memory import MemorySink
+from ursus.sources.memory import MemorySource
+
+
+def test_get_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "content_path", tmp_path)
+    source = MemorySource({"posts/hello.md": "Hello", "posts/_draft.md": "Draft", "posts/photo.jpg": b""})
+
+    assert sorted(source.get_files()) == [Path("posts/hello.md"), Path("posts/photo.jpg")]
+    assert source.get_files(suffix=".md") == [Path("posts/hello.md")]
+    assert source.get_files(whitelist={tmp_path / "posts/photo.jpg", tmp_path / "missing.md"}) == [
+        Path("posts/photo.jpg")
+    ]
+    assert source.exists(tmp_path / "posts")
+    assert not source.is_file(tmp_path / "posts")
+    assert source.read_text(tmp_path / "posts/hello.md") == "Hello"
+
+
+def test_build_in_memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "content_path", tmp_path / "content")
+    monkeypatch.setattr(config, "templates_path", tmp_path / "templates")
+    monkeypatch.setattr(config, "persistent_cache", False)
+    monkeypatch.setattr(config, "renderers", ["ursus.renderers.jinja.JinjaRenderer"])
+    monkeypatch.setattr(config, "content_source", MemorySource({"posts/hello.md": "---\ntitle: Hello\n---\nWorld"}))
+    monkeypatch.setattr(config, "output_sink", MemorySink())
+    (config.templates_path / "posts").mkdir(parents=True)
+    (config.templates_path / "posts/entry.html.jinja").write_text("{{ entry.title }}: {{ entry.body }}")
+
+    StaticSiteGenerator().generate()
+
+    assert config.output_sink.files == {Path("posts/hello.html"): b"Hello: <p>World</p>"}
+    assert not config.content_path.exists()
+
+
+def test_lint_line_numbers(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "content_path", tmp_path)
+    # Form feeds and Unicode line separators are not line breaks for the linters
+    text = "Page one\x0cpage two with a footnote.[^1]\n\nSecond line.[^2]\n\n[^2]: Definition\n"
+    monkeypatch.setattr(config, "content_source", MemorySource({"posts/hello.md": text}))
+
+    assert [position for position, message, level in OrphanFootnotesLinter().lint(Path("posts/hello.md"))] == [
+        (0, 34, 38)
+    ]
@@ -0,0 +1,155 @@
+from PIL import Image, ImageChops, ImageStat
+from ursus.config import config
+from pathlib import Path
+from ursus import utils
+from ursus.utils import (
+    copy_file,
+    get_image_transforms,
+    is_in_shard,
+    make_image_thumbnail,
+    make_pdf_thumbnail,
+    mirror_file,
+)
+import errno
+import fitz
+import math
+import pytest
+import sys
+
+
+# Minimum peak signal-to-noise ratio (in dB) between a fast thumbnail and a fully resampled one
+min_thumbnail_psnr = 40
+
+
+def psnr(image_a: Image.Image, image_b: Image.Image) -> float:
+    mean_squared_error = sum(ImageStat.Stat(ImageChops.difference(image_a, image_b)).sum2) / (
+        image_a.width * image_a.height * len(image_a.getbands())
+    )
+    return math.inf if mean_squared_error == 0 else 10 * math.log10(255**2 / mean_squared_error)
+
+
+@pytest.mark.parametrize("suffix", [".jpg", ".png"])
+@pytest.mark.parametrize("max_size", [(300, 300), (800, 800)])
+def test_reduced_thumbnail_quality(tmp_path, suffix, max_size):
+    original_path = tmp_path / f"original{suffix}"
+    Image.effect_mandelbrot((3000, 2000), (-2, -1.2, 1, 1.2), 100).convert("RGB").save(original_path, quality=95)
+
+    with Image.open(original_path) as reference:
+        reference.load()
+        reference.thumbnail(max_size, Image.Resampling.LANCZOS, reducing_gap=None)
+
+    thumbnail_path = tmp_path / "thumbnail.png"
+    with Image.open(original_path) as original:
+        make_image_thumbnail(original, max_size, thumbnail_path)
+
+    with Image.open(thumbnail_path) as thumbnail:
+        assert thumbnail.size == reference.size
+        assert psnr(thumbnail.convert("RGB"), reference) >= min_thumbnail_psnr
+
+
+def test_thumbnail_without_reduction(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "image_reducing_gap", None)
+    original_path = tmp_path / "original.jpg"
+    Image.effect_mandelbrot((1200, 800), (-2, -1.2, 1, 1.2), 100).convert("RGB").save(original_path)
+
+    with Image.open(original_path) as reference:
+        reference.load()
+        reference.thumbnail((300, 300), Image.Resampling.LANCZOS, reducing_gap=None)
+
+    thumbnail_path = tmp_path / "thumbnail.png"
+    with Image.open(original_path) as original:
+        make_image_thumbnail(original, (300, 300), thumbnail_path)
+
+    with Image.open(thumbnail_path) as thumbnail:
+        assert psnr(thumbnail.convert("RGB"), reference) == math.inf
+
+
+def test_pdf_thumbnail(tmp_path):
+    with fitz.open() as pdf_document:
+        pdf_document.new_page(width=600, height=800)
+        pdf_document.save(tmp_path / "document.pdf")
+
+    make_pdf_thumbnail(tmp_path / "document.pdf", (300, 300), tmp_path / "thumbnail.png")
+
+    with Image.open(tmp_path / "thumbnail.png") as thumbnail:
+        assert thumbnail.size == (225, 300)
+
+
+image_transforms = {
+    "": {"max_size": (5000, 5000)},
+    "small": {"max_size": (300, 300), "output_types": ("webp", "original")},
+    "medium": {"max_size": (800, 800), "output_types": ("webp", "original")},
+}
+
+
+def test_image_transform_output_size(monkeypatch):
+    monkeypatch.setattr(config, "image_transforms", image_transforms)
+    transforms = {str(t["output_path"]): t for t in get_image_transforms(Path("images/photo.jpg"), (2000, 1000))}
+    assert (transforms["images/photo.jpg"]["output_width"], transforms["images/photo.jpg"]["output_height"]) == (
+        2000,
+        1000,
+    )
+    assert transforms["images/small/photo.jpg"]["output_width"] == 300
+    assert transforms["images/medium/photo.webp"]["output_width"] == 800
+    assert not any(t.get("duplicate_of") for t in transforms.values())
+
+
+def test_image_transforms_that_do_not_resize_are_duplicates(monkeypatch):
+    monkeypatch.setattr(config, "image_transforms", image_transforms)
+    transforms = {str(t["output_path"]): t for t in get_image_transforms(Path("images/icon.png"), (200, 100))}
+    assert "duplicate_of" not in transforms["images/icon.png"]
+    assert "duplicate_of" not in transforms["images/small/icon.webp"]
+    assert transforms["images/small/icon.png"]["duplicate_of"] == Path("images/icon.png")
+    assert transforms["images/medium/icon.png"]["duplicate_of"] == Path("images/icon.png")
+    assert transforms["images/medium/icon.webp"]["duplicate_of"] == Path("images/small/icon.webp")
+
+
+def test_each_key_is_in_one_shard(monkeypatch):
+    keys = [f"posts/post-{i}.md" for i in range(100)]
+    shards = []
+    for shard_number in (1, 2, 3):
+        monkeypatch.setattr(config, "shard", (shard_number, 3))
+        shards.append({key for key in keys if is_in_shard(key)})
+
+    assert sorted(key for shard in shards for key in shard) == sorted(keys)
+    assert all(shard for shard in shards)
+
+
+@pytest.mark.parametrize("hard_link", [False, True])
+def test_mirror_file(tmp_path, hard_link):
+    (tmp_path / "style.css").write_text("body {}")
+    output_path = tmp_path / "output/style.css"
+
+    assert mirror_file(tmp_path / "style.css", output_path, hard_link)
+    assert output_path.read_text() == "body {}"
+    assert output_path.samefile(tmp_path / "style.css") == hard_link
+    assert not mirror_file(tmp_path / "style.css", output_path, hard_link)
+
+    (tmp_path / "style.css").unlink()
+    (tmp_path / "style.css").write_text("body { margin: 0; }")
+    assert mirror_file(tmp_path / "style.css", output_path, hard_link)
+    assert output_path.read_text() == "body { margin: 0; }"
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="Reflinks are only supported on Linux")
+def test_reflinks_are_not_tried_again_on_unsupported_devices(tmp_path, monkeypatch):
+    import fcntl
+
+    ioctl_calls = []
+
+    def unsupported_ioctl(*args):
+        ioctl_calls.append(args)
+        raise OSError(errno.EOPNOTSUPP, "Operation not supported")
+
+    monkeypatch.setattr(fcntl, "ioctl", unsupported_ioctl)
+    monkeypatch.setattr(utils, "reflink_unsupported_devices", set())
+    for name in ("a.css", "b.css", "c.css"):
+        (tmp_path / name).write_text(name)
+
+    copy_file(tmp_path / "a.css", tmp_path / "output/a.css")
+    assert not ioctl_calls
+
+    for name in ("a.css", "b.css", "c.css"):
+        assert mirror_file(tmp_path / name, tmp_path / "output" / name)
+        assert (tmp_path / "output" / name).read_text() == name
+    assert len(ioctl_calls) == 1
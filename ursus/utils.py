@@ -3,11 +3,14 @@ from pathlib import Path
 from PIL import Image, ImageCms
 from PIL.Image import Image as ImageType
 from types import ModuleType
-from typing import Any, Iterator, Tuple, List
+from typing import Any, BinaryIO, Iterator, Tuple, List
 from ursus.config import config
 from ursus.context_processors import Context, EntryURI
+from ursus.sources import get_content_source
 from xml.etree import ElementTree
+import errno
 import fitz
+import hashlib
 import imagesize
 import io
 import logging
@@ -93,7 +96,7 @@ def is_image(path: Path) -> bool:
         ".svg",
         ".webp",
     )
-    return path.is_file() and path.suffix.lower() in image_suffixes
+    return path.suffix.lower() in image_suffixes and get_content_source().is_file(path)
 
 
 def is_pdf(path: Path) -> bool:
@@ -106,7 +109,7 @@ def is_pdf(path: Path) -> bool:
         bool: Whether this file is a PDF
     """
     assert path.is_absolute(), "is_pdf must be called with an absolute path"
-    return path.is_file() and path.suffix.lower() == ".pdf"
+    return path.suffix.lower() == ".pdf" and get_content_source().is_file(path)
 
 
 def is_svg(path: Path) -> bool:
@@ -119,7 +122,7 @@ def is_svg(path: Path) -> bool:
         bool: Whether this file is an SVG image
     """
     assert path.is_absolute(), "is_svg must be called with an absolute path"
-    return path.is_file() and path.suffix.lower() == ".svg"
+    return path.suffix.lower() == ".svg" and get_content_source().is_file(path)
 
 
 def is_raster_image(path: Path) -> bool:
@@ -144,6 +147,30 @@ def get_image_size(path: Path) -> tuple[int, int]:
         raise Exception(f"Invalid image size: {path}") from e
 
 
+def get_image_metadata(path: Path) -> dict[str, Any]:
+    """
+    Reads information about an image without decoding it.
+
+    Args:
+        path (Path): The absolute Path to an image in the content source
+    Returns:
+        dict: The image width, height and format (for example "JPEG")
+    """
+    content_source = get_content_source()
+    local_path = content_source.get_local_path(path)
+    image_format = Image.registered_extensions().get(path.suffix.lower())
+    if local_path:
+        # imagesize only reads the first bytes of the file, which is much faster than opening the image with Pillow
+        width, height = get_image_size(local_path)
+        return {"width": width, "height": height, "format": image_format}
+
+    try:
+        with content_source.open(path) as file, Image.open(file) as pil_image:
+            return {"width": pil_image.width, "height": pil_image.height, "format": pil_image.format or image_format}
+    except Exception as e:
+        raise Exception(f"Invalid image: {path}") from e
+
+
 def get_files_in_path(
     path: Path, whitelist: set[Path] | None = None, suffix: str | None = None
 ) -> list[Path]:
@@ -174,6 +201,41 @@ def get_files_in_path(
     ]
 
 
+def is_in_shard(key: str) -> bool:
+    """
+    Splits the work between shards when config.shard is set. The same key is always in the same shard.
+
+    Args:
+        key (str): Identifies a piece of work, for example an entry URI or an output path
+    Returns:
+        bool: Whether the current shard does this work
+    """
+    if config.shard is None:
+        return True
+    shard_number, shard_count = config.shard
+    key_hash = int.from_bytes(hashlib.sha256(key.encode()).digest()[:8])
+    return key_hash % shard_count == shard_number - 1
+
+
+def get_shard_output_path(output_path: Path, shard_number: int, shard_count: int) -> Path:
+    """
+    Returns:
+        Path: The directory where a shard is rendered, next to the output_path. For example, output.shard-2-of-4
+    """
+    return output_path.with_name(f"{output_path.name}.shard-{shard_number}-of-{shard_count}")
+
+
+def get_fingerprinted_path(path: Path, file_hash: str) -> Path:
+    """
+    Args:
+        path (Path): The path of a file
+        file_hash (str): The hexadecimal hash of the file's content
+    Returns:
+        Path: The path with a part of the hash before the suffix. For example, style.css becomes style.3f9a1c2e.css
+    """
+    return path.with_name(f"{path.stem}.{file_hash[:8]}{path.suffix}")
+
+
 def copy_file(input_path: Path, output_path: Path) -> None:
     """Copies a file
 
@@ -192,6 +254,112 @@ def copy_file(input_path: Path, output_path: Path) -> None:
     shutil.copy(input_path, output_path)
 
 
+# The FICLONE ioctl from linux/fs.h. Only defined in the fcntl module since Python 3.12.
+FICLONE = 0x40049409
+
+# The (input device, output device) pairs that don't support reflinks, so that they are not tried again
+reflink_unsupported_devices: set[tuple[int, int]] = set()
+
+
+def reflink_file(input_path: Path, output_path: Path) -> bool:
+    """Creates a copy-on-write clone of a file. The clone shares the data of the original file until one of them is
+    modified. Only supported on Linux, by some file systems (Btrfs, XFS, bcachefs...).
+
+    Args:
+        input_path (Path): The absolute path of the file to clone
+        output_path (Path): The absolute path of the clone. It's replaced if it exists. Its directory must exist.
+    Returns:
+        bool: Whether the file was cloned. If False, the file must be copied instead.
+    """
+    if sys.platform != "linux":
+        return False
+
+    import fcntl
+
+    devices = (input_path.stat().st_dev, output_path.parent.stat().st_dev)
+    if devices in reflink_unsupported_devices:
+        return False
+
+    output_path.unlink(missing_ok=True)
+    try:
+        with input_path.open("rb") as input_file, output_path.open("wb") as output_file:
+            fcntl.ioctl(output_file.fileno(), getattr(fcntl, "FICLONE", FICLONE), input_file.fileno())
+    except OSError as error:
+        if error.errno in (errno.EOPNOTSUPP, errno.EXDEV):
+            reflink_unsupported_devices.add(devices)
+        output_path.unlink(missing_ok=True)
+        return False
+    shutil.copymode(input_path, output_path)
+    return True
+
+
+def mirror_file(input_path: Path, output_path: Path, hard_link: bool = False) -> bool:
+    """Makes the output file a copy of the input file, as cheaply as possible. If the output file has the same size
+    and modification time as the input file, it's already a copy, and nothing is done. Otherwise the input file is
+    cloned (reflink), or hard linked, or copied.
+
+    Args:
+        input_path (Path): The absolute path of the file to mirror
+        output_path (Path): The absolute path of the file destination
+        hard_link (bool): Whether the output file can be a hard link to the input file. Hard linked files share
+            their content, so the output file must not be modified in place.
+    Returns:
+        bool: Whether the output file was written
+    """
+    assert input_path.is_absolute(), (
+        f"input_path {str(input_path)} is relative. It must be absolute."
+    )
+    assert output_path.is_absolute(), (
+        f"output_path {str(output_path)} is relative. It must be absolute."
+    )
+
+    input_stat = input_path.stat()
+    try:
+        output_stat = output_path.stat()
+        if (output_stat.st_size, output_stat.st_mtime_ns) == (input_stat.st_size, input_stat.st_mtime_ns):
+            return False
+    except FileNotFoundError:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if reflink_file(input_path, output_path):
+        # Keep the modification time, so that the next build can tell that the file is unchanged
+        os.utime(output_path, ns=(input_stat.st_atime_ns, input_stat.st_mtime_ns))
+        return True
+
+    output_path.unlink(missing_ok=True)
+    if hard_link:
+        try:
+            os.link(input_path, output_path)
+            return True
+        except OSError:
+            pass
+    shutil.copy2(input_path, output_path)
+    return True
+
+
+def link_or_copy_file(input_path: Path, output_path: Path) -> None:
+    """Creates a hard link to a file, or copies it if hard links are not possible (for example across file systems).
+    The existing output file is replaced, not overwritten, so that the files it is linked to are not modified.
+
+    Args:
+        input_path (Path): The absolute path of the file to link
+        output_path (Path): The absolute path of the file destination
+    """
+    assert input_path.is_absolute(), (
+        f"input_path {str(input_path)} is relative. It must be absolute."
+    )
+    assert output_path.is_absolute(), (
+        f"output_path {str(output_path)} is relative. It must be absolute."
+    )
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.unlink(missing_ok=True)
+    try:
+        os.link(input_path, output_path)
+    except OSError:
+        shutil.copy2(input_path, output_path)
+
+
 def convert_to_srgb(pil_image: ImageType) -> ImageType:
     """
     Convert PIL image to sRGB color space (if possible), since the profile
@@ -215,30 +383,84 @@ def convert_to_srgb(pil_image: ImageType) -> ImageType:
     return pil_image
 
 
-def make_image_thumbnail(pil_image: ImageType, max_size, output_path: Path) -> None:
+def get_image_encoder_profile() -> dict[str, Any]:
+    """
+    Returns:
+        dict: The settings used to resize and save images, from config.image_encoder_profiles
+    """
+    profile_name = config.image_encoder_profile or "production"
+    profile = config.image_encoder_profiles[profile_name]
+    return {
+        "name": profile_name,
+        "resample": profile.get("resample", "lanczos"),
+        "reducing_gap": profile.get("reducing_gap", config.image_reducing_gap),
+        "save_args": profile.get("save_args", {}),
+    }
+
+
+def get_image_save_args(output_suffix: str) -> dict[str, Any]:
+    """
+    Args:
+        output_suffix (str): The suffix of the output image, for example ".jpg"
+    Returns:
+        dict: The arguments passed to Pillow when saving an image of this type
+    """
+    save_args = get_image_encoder_profile()["save_args"]
+    return dict(save_args.get(output_suffix.lower(), save_args.get("*", {})))
+
+
+def make_image_thumbnail(
+    pil_image: ImageType, max_size, output_path: Path, output_file: BinaryIO | None = None
+) -> None:
     """Creates a thumbnail of an image. Strips EXIF metadata.
 
     Args:
         pil_image (Image): A Pillow Image object containing the image to resize
         max_size (TYPE): Max width and height of the preview image
         output_path (Path): Path to the resulting preview
+        output_file (BinaryIO, optional): Save the preview to this file instead. output_path is only used to choose
+            the image format.
     """
-    assert output_path.is_absolute(), (
+    assert output_file or output_path.is_absolute(), (
         f"output_path {str(output_path)} is relative. It must be absolute."
     )
 
+    # Resize before converting the colours, so that the full-size image is never decoded. JPEGs are decoded at a
+    # reduced scale, and other images are reduced by an integer factor before they are resampled.
+    encoder_profile = get_image_encoder_profile()
+    pil_image.thumbnail(
+        max_size,
+        Image.Resampling[encoder_profile["resample"].upper()],
+        reducing_gap=encoder_profile["reducing_gap"],
+    )
     pil_image = convert_to_srgb(pil_image)
-    pil_image.thumbnail(max_size, Image.Resampling.LANCZOS)
-    save_args = {"optimize": True}
-    if output_path.suffix.lower() == ".jpg":
-        save_args["progressive"] = True
-    elif output_path.suffix.lower() == ".webp":
-        save_args["exact"] = True
-
-    output_path.parent.mkdir(parents=True, exist_ok=True)
 
     # Note: The saved image is stripped of EXIF data
-    pil_image.save(output_path, **save_args)
+    if output_file:
+        image_format = Image.registered_extensions()[output_path.suffix.lower()]
+        pil_image.save(output_file, format=image_format, **get_image_save_args(output_path.suffix))
+    else:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        pil_image.save(output_path, **get_image_save_args(output_path.suffix))
+
+
+def render_pdf_page(pdf_document: fitz.Document, max_size, page_number: int = 0) -> ImageType:
+    """Renders a PDF page as an image. The page is rasterised at the right resolution to fit in max_size, but it's never
+    rendered bigger than its default size (72 DPI).
+
+    Args:
+        pdf_document (Document): An open PyMuPDF document
+        max_size (TYPE): Max width and height of the image
+        page_number (int, optional): The page to render. Defaults to the first page.
+
+    Returns:
+        Image: A Pillow Image of the page
+    """
+    page = pdf_document[page_number]
+    max_width, max_height = max_size
+    zoom = min(max_width / page.rect.width, max_height / page.rect.height, 1)
+    pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    return Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
 
 
 def make_pdf_thumbnail(pdf_path: Path, max_size, output_path: Path) -> None:
@@ -253,19 +475,37 @@ def make_pdf_thumbnail(pdf_path: Path, max_size, output_path: Path) -> None:
         f"output_path {str(output_path)} is relative. It must be absolute."
     )
 
-    width, height = max_size
-    doc = fitz.open(pdf_path)
-    pixmap = doc[0].get_pixmap(alpha=False)
-    thumbnail = Image.frombytes("RGB", [pixmap.width, pixmap.height], pixmap.samples)
-    make_image_thumbnail(thumbnail, max_size, output_path)
+    with fitz.open(pdf_path) as pdf_document:
+        make_image_thumbnail(render_pdf_page(pdf_document, max_size), max_size, output_path)
 
 
-def get_image_transforms(original_path: Path) -> Iterator[dict]:
+def get_thumbnail_size(image_size: tuple[int, int], max_size: tuple[int, int] | None) -> tuple[int, int]:
+    """
+    Args:
+        image_size (tuple): The width and height of the original image
+        max_size (tuple): Max width and height of the thumbnail
+    Returns:
+        tuple: The width and height of the thumbnail. Images are never enlarged.
+    """
+    width, height = image_size
+    if not max_size or (max_size[0] >= width and max_size[1] >= height):
+        return width, height
+
+    scale = min(max_size[0] / width, max_size[1] / height)
+    return max(round(width * scale), 1), max(round(height * scale), 1)
+
+
+def get_image_transforms(original_path: Path, image_size: tuple[int, int] | None = None) -> Iterator[dict]:
     """
     Yields a list of image transforms that apply to a file.
 
+    If the image size is known, the size of each output image is also included. Transforms that create the same image
+    as a previous transform (for example because the original image is smaller than both) are marked as duplicates
+    of that transform's output.
+
     Args:
         original_path (Path): Path of the original file/image to transform, relative to config.content_path
+        image_size (tuple, optional): Width and height of the original image
 
     Yields:
         Iterator[dict]: A list of image transforms that apply to this file.
@@ -284,6 +524,9 @@ def get_image_transforms(original_path: Path) -> Iterator[dict]:
 
     assert not original_path.is_absolute(), "original_path must be a relative path"
 
+    # The output path of each (output suffix, output size) combination
+    output_paths_by_result: dict[tuple[str, tuple[int, int]], Path] = {}
+
     for key, transform in config.image_transforms.items():
         includes = transform.get("include", ["*"])
         includes = [includes] if isinstance(includes, str) else includes
@@ -315,16 +558,28 @@ def get_image_transforms(original_path: Path) -> Iterator[dict]:
 
                     output_image_path = original_path.with_suffix(suffix)
 
+                output_path = output_image_path.parent / key / output_image_path.name  # It works if key is empty
+
+                output_info = {}
+                if image_size:
+                    output_size = get_thumbnail_size(image_size, transform.get("max_size"))
+                    output_info["output_width"], output_info["output_height"] = output_size
+
+                    result = (suffix, output_size)
+                    if result in output_paths_by_result:
+                        output_info["duplicate_of"] = output_paths_by_result[result]
+                    else:
+                        output_paths_by_result[result] = output_path
+
                 yield {
                     **transform,
+                    **output_info,
                     "is_default": key == "",
                     "input_mimetype": suffix_to_mimetype[original_path.suffix.lower()],
                     "output_mimetype": suffix_to_mimetype[
                         output_image_path.suffix.lower()
                     ],
-                    "output_path": output_image_path.parent
-                    / key
-                    / output_image_path.name,  # It works if key is empty
+                    "output_path": output_path,
                 }
 
 
@@ -341,15 +596,18 @@ def make_picture_element(
     default_src = None
 
     # Build a list of srcsets grouped by mimetype
-    sources_by_mimetype: dict[str, list[str]] = {}
+    sources_by_mimetype: dict[str, dict[int, str]] = {}
     for transform in context["entries"][entry_uri]["transforms"]:
-        width = transform["max_size"][0]
+        if transform.get("duplicate_of"):
+            continue
+
+        width = transform.get("output_width", transform["max_size"][0])
         mimetype = transform["output_mimetype"]
 
         if mimetype.startswith("image/"):
             srcset_part = f"{config.site_url}/{str(transform['output_path'])} {width}w"
-            sources_by_mimetype.setdefault(mimetype, [])
-            sources_by_mimetype[mimetype].append(srcset_part)
+            sources_by_mimetype.setdefault(mimetype, {})
+            sources_by_mimetype[mimetype].setdefault(width, srcset_part)
 
             if not default_src and mimetype in standard_mimetypes:
                 default_src = transform["output_path"]
@@ -360,7 +618,7 @@ def make_picture_element(
         source = ElementTree.SubElement(
             picture,
             "source",
-            attrib={"type": mimetype, "srcset": ", ".join(srcset_elements)},
+            attrib={"type": mimetype, "srcset": ", ".join(srcset_elements.values())},
         )
         if sizes:
             source.attrib["sizes"] = sizes